@@ -3,7 +3,18 @@ from backend.config import DevelopmentConfig
 from backend.models import db, migrate, cors, bcrypt, oauth, sess
 from flask import Flask, jsonify, request
 from flask_cors import CORS
+from backend.utils.breach import breach
+from backend.utils.compression import init_compression
+from backend.utils.favicons import favicons
+from backend.utils.hashing import hasher
 from backend.utils.helpers import check_session, register_google_oauth
+from backend.utils.instrumentation import init_sql_instrumentation
+from backend.utils.jobs import jobs
+from backend.utils.metrics import init_metrics
+from backend.utils.ratelimit import limiter
+from backend.utils.retention import purger
+from backend.utils.sessions import init_session_store
+from backend.utils.vault import recount_command
 from . import v1_bp
 
 
@@ -13,24 +24,51 @@ def create_app(config_class=DevelopmentConfig):
     # Apply configuration from config.py
     app.config.from_object(config_class)
 
-    # Initialize the database, migrate, cors, bcrypt & oauth
+    # Initialize the database, migrate, cors, bcrypt, oauth & sessions
     db.init_app(app)
     migrate.init_app(app, db)
     bcrypt.init_app(app)
+    hasher.init_app(app)
+    limiter.init_app(app)
     oauth.init_app(app)
-    sess.init_app(app)
+    if app.config['SESSION_STORE'] == 'sql':
+        init_session_store(app)
+    else:
+        sess.init_app(app)
     cors.init_app(app, resources={
         r"/*": {
             "origins": app.config['CLIENT_ADDRESS'],
             "methods": ["GET", "HEAD","POST", "OPTIONS", "PUT", "PATCH", "DELETE"],
             "supports_credentials": True,
             "allow_headers": ["Content-Type", "Authorization", "X-Requested-With"],
-            "expose_headers": ["Content-Type", "X-CSRFToken"],
+            "expose_headers": ["Content-Type", "X-CSRFToken", "ETag", "Retry-After",
+                               "Server-Timing"],
             "max_age": 3600,
             "send_wildcard": False
         }
     })
 
+    # Per-request SQL statistics, when enabled
+    init_sql_instrumentation(app)
+
+    # Response compression negotiated from Accept-Encoding
+    init_compression(app)
+
+    # Start the background job pool used by async imports/exports
+    jobs.init_app(app)
+
+    # Server-side favicon resolution and storage
+    favicons.init_app(app)
+
+    # Deletes entries left in the trash past the retention period
+    purger.init_app(app)
+
+    # Offline breached-password lookups
+    breach.init_app(app)
+
+    # Repairs the users' entry counters
+    app.cli.add_command(recount_command)
+
     # Register Google OAuth provider
     register_google_oauth(app)
 
@@ -44,6 +82,10 @@ def create_app(config_class=DevelopmentConfig):
     #     """Handles preflight requests for all routes."""
     #     return '', 204
 
+    # Request metrics, set up first so that requests turned away by the
+    # session check are counted as well
+    init_metrics(app)
+
     # Apply session check globally
     @app.before_request
     def before_request():
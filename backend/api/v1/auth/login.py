@@ -1,6 +1,8 @@
 #!/usr/bin/python3
 from flask import Blueprint, request, session, jsonify
 from backend.utils.auth import Auth
+from backend.utils.hashing import HashingBusy
+from backend.utils.ratelimit import limiter
 
 
 AUTH = Auth()
@@ -9,6 +11,7 @@ login_bp = Blueprint('login', __name__)
 
 
 @login_bp.route('/login', methods=['POST'])
+@limiter.limit('login')
 def login():
     """Login user and create session to keep track."""
     try:
@@ -28,6 +31,8 @@ def login():
 
         return jsonify({"error": "Invalid credentials"}), 401
 
+    except HashingBusy as e:
+        return jsonify({"error": str(e)}), 503, {"Retry-After": "1"}
     except Exception as e:
         return jsonify({"error": "An error occurred during login"}), 500
 
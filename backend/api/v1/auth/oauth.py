@@ -4,6 +4,7 @@ from flask import Blueprint, jsonify, redirect, request, session, url_for
 from backend.models import oauth
 from backend.models.user import User
 from backend.utils.auth import Auth
+from backend.utils.ratelimit import limiter
 from urllib.parse import urlencode
 from dotenv import load_dotenv
 import secrets
@@ -31,6 +32,7 @@ def google_login():
 
 
 @oauth_bp.route('/callback')
+@limiter.limit('callback')
 def callback():
     """Redirect for google login"""
     try:
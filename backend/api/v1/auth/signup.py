@@ -1,6 +1,8 @@
 #!/usr/bin/python3
 from flask import Blueprint, request, jsonify
 from backend.utils.auth import Auth
+from backend.utils.hashing import HashingBusy
+from backend.utils.ratelimit import limiter
 
 
 AUTH = Auth()
@@ -9,6 +11,7 @@ signup_bp = Blueprint('signup', __name__)
 
 
 @signup_bp.route('/signup', methods=['POST'])
+@limiter.limit('signup')
 def signup():
     """Create a user account and register entry in database."""
     try:
@@ -29,5 +32,7 @@ def signup():
 
     except ValueError as e:
         return jsonify({"error": str(e)}), 409
+    except HashingBusy as e:
+        return jsonify({"error": str(e)}), 503, {"Retry-After": "1"}
     except Exception as e:
         return jsonify({"error": "An error occurred during signup"}), 500
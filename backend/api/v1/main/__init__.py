@@ -8,6 +8,11 @@ from .password import password_bp
 from .trash import trash_bp
 from .internalApi import internal_api
 from .import_export import import_export_bp
+from .jobs import jobs_bp
+from .metrics import metrics_bp
+from .favicon import favicon_bp
+from .vault import vault_bp
+from .breach import breach_bp
 
 main_bp = Blueprint("main", __name__)
 
@@ -18,3 +23,8 @@ main_bp.register_blueprint(password_bp)
 main_bp.register_blueprint(trash_bp)
 main_bp.register_blueprint(internal_api)
 main_bp.register_blueprint(import_export_bp)
+main_bp.register_blueprint(jobs_bp)
+main_bp.register_blueprint(metrics_bp)
+main_bp.register_blueprint(favicon_bp)
+main_bp.register_blueprint(vault_bp)
+main_bp.register_blueprint(breach_bp)
@@ -0,0 +1,69 @@
+#!/usr/bin/python3
+"""
+handling /breach endpoints to check
+password hashes against breach data
+held by the server, by hash prefix
+"""
+
+from backend.utils.breach import (PREFIX_PATTERN, BreachDataUnavailable,
+                                  breach)
+from flask import Blueprint, current_app, jsonify, request, session
+
+breach_bp = Blueprint('breach', __name__)
+
+
+@breach_bp.route('/breach/range/<prefix>', methods=['GET'])
+def get_breach_range(prefix):
+    '''
+    retrieves the suffixes and counts of the breached SHA-1 hashes
+    starting with a 5 hex digit prefix, as SUFFIX:COUNT lines
+    '''
+    # authenticating a user
+    user_id = session.get('user_id')
+    if not user_id:
+        return jsonify({"error": "Unauthorized"}), 401
+
+    if not PREFIX_PATTERN.fullmatch(prefix):
+        return jsonify({"error": "Prefix must be 5 hex digits"}), 400
+
+    try:
+        results = breach.range(prefix)
+    except BreachDataUnavailable as e:
+        return jsonify({"error": str(e)}), 503
+
+    # The same lines as the Pwned Passwords range API
+    body = ''.join(f'{suffix}:{count}\r\n' for suffix, count in results)
+    response = current_app.response_class(body, mimetype='text/plain')
+    response.headers['Cache-Control'] = 'private, max-age=86400'
+    return response, 200
+
+
+@breach_bp.route('/breach/ranges', methods=['POST'])
+def get_breach_ranges():
+    '''retrieves the breached hashes of several prefixes at once'''
+    # authenticating a user
+    user_id = session.get('user_id')
+    if not user_id:
+        return jsonify({"error": "Unauthorized"}), 401
+
+    data = request.get_json(silent=True) or {}
+    prefixes = data.get('prefixes')
+    if not isinstance(prefixes, list) or not prefixes:
+        return jsonify({"error": "prefixes must be a non-empty list"}), 400
+
+    max_prefixes = current_app.config['BREACH_MAX_PREFIXES']
+    if len(prefixes) > max_prefixes:
+        return jsonify({"error": f"At most {max_prefixes} prefixes"}), 400
+    if not all(isinstance(prefix, str) and PREFIX_PATTERN.fullmatch(prefix)
+               for prefix in prefixes):
+        return jsonify({"error": "Prefixes must be 5 hex digits"}), 400
+
+    try:
+        ranges = {
+            prefix.upper(): dict(breach.range(prefix))
+            for prefix in prefixes
+        }
+    except BreachDataUnavailable as e:
+        return jsonify({"error": str(e)}), 503
+
+    return jsonify(ranges=ranges), 200
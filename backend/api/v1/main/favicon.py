@@ -0,0 +1,64 @@
+#!/usr/bin/python3
+"""
+handling /favicons endpoints to
+resolve the favicons of sites
+and serve them by content hash
+"""
+
+from backend.utils.favicons import favicons, normalize_host
+from flask import Blueprint, current_app, jsonify, request, session, url_for
+
+favicon_bp = Blueprint('favicon', __name__)
+
+
+@favicon_bp.route('/favicons/resolve', methods=['POST'])
+def resolve_favicons():
+    '''resolves the favicons of a batch of hosts or urls'''
+    # authenticating a user
+    user_id = session.get('user_id')
+    if not user_id:
+        return jsonify({"error": "Unauthorized"}), 401
+
+    data = request.get_json(silent=True) or {}
+    hosts = data.get('hosts')
+    if not isinstance(hosts, list) or not hosts:
+        return jsonify({"error": "hosts must be a non-empty list"}), 400
+
+    max_batch = current_app.config['FAVICON_MAX_BATCH']
+    if len(hosts) > max_batch:
+        return jsonify({"error": f"At most {max_batch} hosts per request"}), 400
+
+    # Each value sent -> its host, None for values without a valid host
+    normalized = {}
+    for value in hosts:
+        if isinstance(value, str):
+            normalized[value] = normalize_host(value)
+
+    hashes = favicons.resolve(
+        sorted({host for host in normalized.values() if host}))
+
+    result = {}
+    for value, host in normalized.items():
+        content_hash = hashes.get(host) if host else None
+        result[value] = {
+            'host': host,
+            'hash': content_hash,
+            'url': url_for('.get_favicon', content_hash=content_hash)
+                   if content_hash else None,
+        }
+    return jsonify(favicons=result), 200
+
+
+@favicon_bp.route('/favicons/<content_hash>', methods=['GET'])
+def get_favicon(content_hash):
+    '''serves a stored favicon; its url never changes content'''
+    icon = favicons.load(content_hash)
+    if icon is None:
+        return jsonify({"error": "Favicon not found"}), 404
+
+    data, mimetype = icon
+    response = current_app.response_class(data, mimetype=mimetype)
+    response.set_etag(content_hash)
+    response.headers['Cache-Control'] = 'public, max-age=31536000, immutable'
+    response.headers['X-Content-Type-Options'] = 'nosniff'
+    return response.make_conditional(request)
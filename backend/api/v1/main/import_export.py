@@ -1,10 +1,12 @@
 #!/usr/bin/python3
-from backend.models.password import PasswordEntry
-from flask import Blueprint, Flask, jsonify, request, session, Response
+from flask import (Blueprint, current_app, jsonify, request, session,
+                   Response, stream_with_context)
 from backend.models import db
-import csv
-import json
-from io import StringIO
+from backend.utils.exporter import EXPORT_MIMETYPES, export_chunks
+from backend.utils.importer import (ImportTooLarge, import_entries,
+                                    iter_json_entries)
+from backend.utils.jobs import JobQueueFull, jobs, spool_stream
+import os
 
 
 import_export_bp = Blueprint('import_export', __name__)
@@ -12,85 +14,136 @@ import_export_bp = Blueprint('import_export', __name__)
 
 @import_export_bp.route('/import', methods=['POST'])
 def import_data():
-    """Imports user data from encrypted JSON"""
+    """
+    Imports user data from encrypted JSON (an array, or one entry per line),
+    parsed while it is read and inserted in batches
+    """
     try:
         user_id = session.get('user_id')
         if not user_id:
             return jsonify({"error": "Unauthorized"}), 401
 
-        # Step 1: Retrieve JSON data directly from request
-        data = request.get_json()
-        if not data:
+        max_bytes = current_app.config['IMPORT_MAX_BYTES']
+        if request.content_length and request.content_length > max_bytes:
+            return jsonify({"error": f"Import is larger than {max_bytes} bytes"}), 413
+
+        # Background mode: keep the body in a file and import it in a job
+        if is_async():
+            path = jobs.new_file('.json')
+            if not spool_stream(request.stream, path, max_bytes):
+                os.remove(path)
+                return jsonify({"error": f"Import is larger than {max_bytes} bytes"}), 413
+            return submit_job(user_id, 'import', run_import_job, user_id, path,
+                              max_bytes, current_app.config['IMPORT_BATCH_SIZE'],
+                              cleanup=path)
+
+        # Step 1: Parse the entries from the request body as it arrives
+        entries = iter_json_entries(request.stream, max_bytes)
+
+        # Step 2: Insert them into the database, one batch at a time
+        summary, error = import_entries(
+            user_id, entries, current_app.config['IMPORT_BATCH_SIZE']
+        )
+
+        if error is not None:
+            status = 413 if isinstance(error, ImportTooLarge) else 400
+            return jsonify({"error": str(error), **summary}), status
+        if not summary['batches']:
             return jsonify({"error": "No data provided"}), 400
 
-        # Step 2: Insert data into the database
-        for entry in data:
-            new_entry = PasswordEntry(
-                user_id=user_id,
-                name=entry.get('name'),
-                username=entry.get('username'),
-                password=entry.get('password'),
-                url=entry.get('url'),
-                favicon_url=entry.get('favicon_url'),
-                notes=entry.get('notes'),
-                created_at=entry.get('created_at'),
-                updated_at=entry.get('updated_at')
-            )
-            db.session.add(new_entry)
-
-        db.session.commit()
-
-        return jsonify({"message": "Data imported successfully!"}), 200
+        return jsonify({"message": "Data imported successfully!", **summary}), 200
 
     except Exception as e:
+        db.session.rollback()
         return jsonify({"error": str(e)}), 500
 
 
 @import_export_bp.route('/export', methods=['GET'])
 def export_data():
-    """Exports user data as CSV/JSON"""
+    """Exports user data as CSV/JSON/NDJSON, streamed in batches"""
     try:
         user_id = session.get('user_id')
         if not user_id:
             return jsonify({"error": "Unauthorized"}), 401
 
         file_type = request.args.get('fileType', 'json')
+        if file_type not in EXPORT_MIMETYPES:
+            return jsonify({'error': 'Invalid file type'}), 400
 
-        # Query user's password entries from the database
-        data = PasswordEntry.query.filter(PasswordEntry.user_id == user_id).all()
-
-        if file_type == 'json':
-            # Manually convert SQLAlchemy objects to a dictionary
-            data_list = [
-                {
-                    'name': item.name,
-                    'username': item.username,
-                    'password': item.password,
-                    'url': item.url,
-                    'favicon_url': item.favicon_url,
-                    'notes': item.notes,
-                    'created_at': item.created_at,
-                    'updated_at': item.updated_at,
-                }
-                for item in data
-            ]
-            return jsonify(data_list)
-
-        elif file_type == 'csv':
-            output = StringIO()
-            writer = csv.writer(output)
-            
-            # Write CSV header based on your model fields
-            writer.writerow(['name', 'username', 'password', 'url', 'favicon_url', 'notes', 'created_at', 'updated_at'])
-
-            # Write data rows
-            for item in data:
-                writer.writerow([item.name, item.username, item.password, item.url, item.favicon_url, item.notes, item.created_at, item.updated_at])
-
-            output.seek(0)
-            return Response(output, mimetype="text/csv", headers={"Content-Disposition": "attachment;filename=exported_data.csv"})
-
-        return jsonify({'error': 'Invalid file type'}), 400
+        if is_async():
+            return submit_job(user_id, 'export', run_export_job, user_id,
+                              file_type)
+
+        headers = {}
+        if file_type != 'json':
+            headers["Content-Disposition"] = (
+                f"attachment;filename=exported_data.{file_type}"
+            )
+
+        # The rows are read and written while the response is sent
+        return Response(
+            stream_with_context(export_chunks(user_id, file_type)),
+            mimetype=EXPORT_MIMETYPES[file_type],
+            headers=headers
+        )
 
     except Exception as e:
         return jsonify({'error': str(e)}), 500
+
+
+def is_async():
+    """Whether the client asked for the work to run as a background job"""
+    return request.args.get('async', '').lower() in ('1', 'true')
+
+
+def submit_job(user_id, kind, func, *args, cleanup=None):
+    """Starts a background job and answers with where to follow it"""
+    try:
+        job = jobs.submit(user_id, kind, func, *args)
+    except JobQueueFull as e:
+        if cleanup:
+            os.remove(cleanup)
+        return jsonify({"error": str(e)}), 503
+
+    return jsonify({
+        "job_id": job.id,
+        "status_url": f"/jobs/{job.id}",
+        "result_url": f"/jobs/{job.id}/result"
+    }), 202
+
+
+def run_import_job(job, user_id, path, max_bytes, batch_size):
+    """Background import of a spooled request body"""
+    def on_batch(summary):
+        job.progress = {
+            'accepted': summary['accepted'],
+            'rejected': summary['rejected'],
+            'batches': len(summary['batches'])
+        }
+
+    try:
+        with open(path, 'rb') as body:
+            summary, error = import_entries(
+                user_id, iter_json_entries(body, max_bytes), batch_size,
+                on_batch=on_batch
+            )
+    finally:
+        os.remove(path)
+
+    job.result = summary
+    if error is not None:
+        raise error
+
+
+def run_export_job(job, user_id, file_type):
+    """Background export into a file served by /jobs/<id>/result"""
+    job.result_path = jobs.new_file('.' + file_type)
+    job.result_mimetype = EXPORT_MIMETYPES[file_type]
+    job.result_filename = f"exported_data.{file_type}"
+    job.progress = {'bytes': 0}
+
+    with open(job.result_path, 'wb') as output:
+        for chunk in export_chunks(user_id, file_type):
+            data = chunk.encode('utf-8')
+            output.write(data)
+            job.progress = {'bytes': job.progress['bytes'] + len(data)}
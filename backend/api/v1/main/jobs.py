@@ -0,0 +1,50 @@
+#!/usr/bin/python3
+"""
+handling /jobs endpoints to follow
+background imports and exports
+and download their results
+"""
+
+from backend.utils.jobs import jobs
+from flask import Blueprint, jsonify, send_file, session
+
+jobs_bp = Blueprint('jobs', __name__)
+
+
+@jobs_bp.route('/jobs/<job_id>', methods=['GET'])
+def get_job(job_id):
+    '''retrieves the status and progress of a job'''
+    # authenticating a user
+    user_id = session.get('user_id')
+    if not user_id:
+        return jsonify({"error": "Unauthorized"}), 401
+
+    job = jobs.get(job_id, user_id)
+    if job is None:
+        return jsonify({"error": "Job not found"}), 404
+
+    return jsonify(job=job.to_dict()), 200
+
+
+@jobs_bp.route('/jobs/<job_id>/result', methods=['GET'])
+def get_job_result(job_id):
+    '''retrieves the result of a finished job'''
+    # authenticating a user
+    user_id = session.get('user_id')
+    if not user_id:
+        return jsonify({"error": "Unauthorized"}), 401
+
+    job = jobs.get(job_id, user_id)
+    if job is None:
+        return jsonify({"error": "Job not found"}), 404
+
+    if job.status == 'failed':
+        return jsonify({"error": job.error, "result": job.result}), 409
+    if job.status != 'done':
+        return jsonify({"error": "Job is not finished", "status": job.status}), 409
+
+    if job.result_path:
+        return send_file(job.result_path, mimetype=job.result_mimetype,
+                         as_attachment=True,
+                         download_name=job.result_filename)
+    return jsonify(job.result), 200
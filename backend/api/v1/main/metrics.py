@@ -0,0 +1,29 @@
+#!/usr/bin/python3
+"""
+handling the /metrics endpoint, scraped by
+a Prometheus-compatible collector with the
+METRICS_TOKEN bearer token
+"""
+
+import hmac
+from backend.utils.metrics import registry
+from flask import Blueprint, Response, current_app, jsonify, request
+
+metrics_bp = Blueprint('metrics', __name__)
+
+
+@metrics_bp.route('/metrics', methods=['GET'])
+def get_metrics():
+    '''renders the metrics in the Prometheus text format'''
+    token = current_app.config['METRICS_TOKEN']
+    # Metrics are off unless a token is configured
+    if not token:
+        return jsonify({"error": "Not found"}), 404
+
+    expected = f'Bearer {token}'
+    provided = request.headers.get('Authorization', '')
+    if not hmac.compare_digest(provided.encode(), expected.encode()):
+        return jsonify({"error": "Unauthorized"}), 401
+
+    return Response(registry.render(),
+                    mimetype='text/plain; version=0.0.4')
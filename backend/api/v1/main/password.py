@@ -8,7 +8,22 @@ for only authenticated users
 
 from backend.models import db
 from backend.models.password import PasswordEntry
-from flask import Blueprint, jsonify, request, session
+from backend.models.password_tombstone import PasswordTombstone
+from backend.models.user import User
+from backend.utils.importer import InvalidEntry, entry_row, insert_rows
+from backend.utils.pagination import (InvalidCursor, decode_cursor,
+                                      encode_cursor, keyset_page)
+from backend.utils.search import (MATCH_MODES, InvalidSearchTokens,
+                                  add_search_tokens, matching_entry_ids,
+                                  parse_search_tokens, set_search_tokens,
+                                  valid_token)
+from backend.utils.serializers import (InvalidFields, entry_columns,
+                                       entry_dicts, entry_query,
+                                       json_response, parse_fields)
+from backend.utils.vault import (adjust_counters, entry_size, next_change_seq,
+                                 vault_etag)
+from flask import Blueprint, current_app, jsonify, request, session
+from sqlalchemy import and_, false, or_, true
 from sqlalchemy.exc import SQLAlchemyError
 from sqlalchemy.sql import func
 
@@ -31,11 +46,22 @@ def create_a_password_entry():
     url = data.get('url')
     favicon_url = data.get('faviconUrl')
     notes = data.get('notes')
+    fingerprint = data.get('fingerprint')
 
     # validating required fields ((non-nullable ones))
     if not name or not username or not password:
         return jsonify({"error": "Missing required fields"}), 400
 
+    # Optional keyed hash of the password, see /passwords/health
+    if fingerprint is not None and not valid_token(fingerprint):
+        return jsonify({"error": "Invalid fingerprint"}), 400
+
+    # Optional blind index tokens, see backend.utils.search
+    try:
+        search_tokens = parse_search_tokens(data.get('search_tokens', []))
+    except InvalidSearchTokens as e:
+        return jsonify({"error": str(e)}), 400
+
     # creating a new pass entry
     new_password = PasswordEntry(
         user_id=user_id,
@@ -44,11 +70,19 @@ def create_a_password_entry():
         password=password,
         url=url,
         notes=notes,
-        favicon_url=favicon_url
+        favicon_url=favicon_url,
+        fingerprint=fingerprint
     )
 
     try:
+        new_password.change_seq = next_change_seq(user_id)
+        adjust_counters(user_id, active=1,
+                        entry_bytes=entry_size(new_password))
         db.session.add(new_password)
+        if search_tokens:
+            # flushing to get the new entry's id for its tokens
+            db.session.flush()
+            add_search_tokens(user_id, {new_password.id: search_tokens})
         db.session.commit()
         return jsonify({"message":
                         "Password entry created successfully. PassId: "
@@ -58,7 +92,73 @@ def create_a_password_entry():
         return jsonify({"error": "Database error: " + str(e)}), 500
 
 
+@password_bp.route('/passwords/batch', methods=['POST'])
+def create_password_entries():
+    '''
+    creates several password entries at once, in one statement.
+    With ?atomic=true (the default, see PASSWORDS_BATCH_ATOMIC) nothing
+    is created if any entry is invalid; with ?atomic=false the valid
+    entries are created and the invalid ones reported
+    '''
+    # authenticating a user
+    user_id = session.get('user_id')
+    if not user_id:
+        return jsonify({"error": "Unauthorized"}), 401
+
+    # Either {"entries": [...]} or the list itself
+    data = request.get_json(silent=True)
+    entries = data.get('entries') if isinstance(data, dict) else data
+    if not isinstance(entries, list) or not entries:
+        return jsonify({"error": "entries must be a non-empty list"}), 400
+
+    max_entries = current_app.config['PASSWORDS_BATCH_MAX']
+    if len(entries) > max_entries:
+        return jsonify({"error":
+                        f"At most {max_entries} entries per batch"}), 400
+
+    atomic = request.args.get(
+        'atomic', str(current_app.config['PASSWORDS_BATCH_ATOMIC'])
+    ).lower() == 'true'
+
+    # Validating every entry before writing anything
+    results = [None] * len(entries)
+    rows, indexes = [], []
+    for index, entry in enumerate(entries):
+        # Same field name as POST /password
+        if isinstance(entry, dict) and 'faviconUrl' in entry:
+            entry = {**entry, 'favicon_url': entry['faviconUrl']}
+        try:
+            rows.append(entry_row(entry, user_id))
+            indexes.append(index)
+        except InvalidEntry as e:
+            results[index] = {'index': index, 'error': str(e)}
+
+    failed = len(entries) - len(rows)
+    if failed and (atomic or not rows):
+        return jsonify({
+            "error": "Invalid entries, none were created",
+            "results": [result for result in results if result]
+        }), 400
+
+    try:
+        ids = insert_rows(user_id, rows, returning=True)
+        db.session.commit()
+    except SQLAlchemyError as e:
+        db.session.rollback()
+        return jsonify({"error": "Database error: " + str(e)}), 500
+
+    for index, new_id in zip(indexes, ids):
+        results[index] = {'index': index, 'id': new_id}
+
+    return jsonify({
+        'created': len(ids),
+        'failed': failed,
+        'results': results
+    }), 201
+
+
 @password_bp.route('/password/<int:pass_ent_id>', methods=['GET'])
+@vault_etag
 def get_a_password(pass_ent_id):
     '''retrieves a password entry by id'''
     # authenticating a user
@@ -67,30 +167,17 @@ def get_a_password(pass_ent_id):
         return jsonify({"error": "Unauthorized"}), 401
 
     # Querying the db to retieve the password by id provided
-    password_entry = PasswordEntry.query.filter_by(user_id=user_id,
-                                                   id=pass_ent_id).first()
+    password_entry = entry_query(user_id).filter(
+        PasswordEntry.id == pass_ent_id).first()
 
     if not password_entry:
         return jsonify(message="Password entry not found"), 404
 
-    # Formatting the password entry
-    pass_ent_data = {
-        'id': password_entry.id,
-        'name': password_entry.name,
-        'username': password_entry.username,
-        'password': password_entry.password,
-        'url': password_entry.url,
-        'notes': password_entry.notes,
-        'created_at': password_entry.created_at,
-        'updated_at': password_entry.updated_at,
-        'in_trash': password_entry.in_trash,
-        'moved_at': password_entry.moved_at     
-    }
-
-    return jsonify(password=pass_ent_data), 200
+    return json_response({'password': entry_dicts([password_entry])[0]}), 200
 
 
 @password_bp.route('/passwords', methods=['GET'])
+@vault_etag
 def get_passwords():
     '''retrieves all the password entries of a certain user'''
     # authenticating a user
@@ -98,50 +185,72 @@ def get_passwords():
     if not user_id:
         return jsonify({"error": "Unauthorized"}), 401
 
+    # Sparse fieldset (?fields=id,name,url): only these columns are read
+    # and sent, so list views can leave out the password and notes
+    try:
+        fields = parse_fields(request.args.get('fields'))
+    except InvalidFields as e:
+        return jsonify({"error": str(e)}), 400
+
+    # Multi-get mode (?ids=1,2,3): these entries, wherever they are
+    if 'ids' in request.args:
+        return get_passwords_by_ids(user_id, fields)
+
     try:
-        # Pagination parameters: page and per_page with default int values
-        page = request.args.get('page', 1, type=int)
-        per_page = request.args.get('per_page', 10, type=int)
-        
         # Get in_trash parameter from query
         in_trash = request.args.get('in_trash', 'false').lower() == 'true'
 
         # Querying the db to retrieve passwords based on in_trash status
-        passwords = PasswordEntry.query.filter_by(
-            user_id=user_id,
-            in_trash=in_trash
-        )
+        passwords = entry_query(user_id, fields).filter(
+            PasswordEntry.in_trash == in_trash)
+
+        # Cursor mode (?after=<cursor>&limit=): keyset pagination over the
+        # (user_id, in_trash, id) index, without OFFSET or COUNT queries
+        if 'after' in request.args or 'limit' in request.args:
+            limit = request.args.get('limit', 10, type=int)
+            limit = max(1, min(limit, current_app.config['PASSWORDS_MAX_LIMIT']))
+
+            try:
+                page_items, next_cursor = keyset_page(
+                    passwords, [PasswordEntry.id],
+                    after=request.args.get('after'),
+                    limit=limit
+                )
+            except InvalidCursor as e:
+                return jsonify({"error": str(e)}), 400
+
+            return json_response({
+                'passwords': entry_dicts(page_items, fields),
+                'limit': limit,
+                'next_cursor': next_cursor,
+                'has_next': next_cursor is not None
+            }), 200
+
+        # Pagination parameters: page and per_page with default int values
+        page = request.args.get('page', 1, type=int)
+        per_page = request.args.get('per_page', 10, type=int)
 
         # Applying pagination using SQLAlchemy’s paginate feature --
         # error_out=False: Prevents an error if page num is too high
         # (e.g., requesting page 10 when only 5 pages exist)
+        # count=False: the total comes from the user's entry counters
+        # rather than a COUNT(*) per page
         paginated_passes = passwords.paginate(
             page=page, 
             per_page=per_page,
-            error_out=False
+            error_out=False,
+            count=False
         )
+        counters = db.session.query(
+            User.active_count, User.trash_count).filter_by(id=user_id).one()
+        total = counters.trash_count if in_trash else counters.active_count
 
-        # Format the passwords to return
-        password_list = [
-            {
-                'id': password.id,
-                'name': password.name,
-                'username': password.username,
-                'password': password.password,
-                'url': password.url,
-                'notes': password.notes,
-                'created_at': password.created_at,
-                'updated_at': password.updated_at,
-                'in_trash': password.in_trash,
-                'moved_at': password.moved_at ,
-                'favicon_url': password.favicon_url,
-            }
-            for password in paginated_passes.items
-        ]
-        return jsonify({
-            'passwords': password_list,
+        return json_response({
+            'passwords': entry_dicts(paginated_passes.items, fields),
             'per_page': per_page,
-            'has_next': paginated_passes.has_next,
+            'total': total,
+            'has_next': (paginated_passes.page * paginated_passes.per_page
+                         < total),
             'has_prev': paginated_passes.has_prev
         }), 200
     except Exception as e:
@@ -150,6 +259,134 @@ def get_passwords():
         }), 500
 
 
+def get_passwords_by_ids(user_id, fields):
+    '''
+    retrieves the entries with the ids of ?ids=1,2,3 (or repeated ?ids=)
+    with one query, in the order asked for; ids that are not the user's
+    entries get a {"id": ..., "not_found": true} marker instead
+    '''
+    try:
+        ids = [int(value) for values in request.args.getlist('ids')
+               for value in values.split(',') if value.strip()]
+    except ValueError:
+        return jsonify({"error": "ids must be integers"}), 400
+    if not ids:
+        return jsonify({"error": "Missing ids"}), 400
+
+    max_ids = current_app.config['PASSWORDS_MAX_IDS']
+    if len(ids) > max_ids:
+        return jsonify({"error": f"At most {max_ids} ids per request"}), 400
+
+    rows = entry_query(user_id, fields).filter(
+        PasswordEntry.id.in_(set(ids))).all()
+    found = {entry['id']: entry for entry in entry_dicts(rows, fields)}
+
+    return json_response({
+        'passwords': [found.get(entry_id, {'id': entry_id, 'not_found': True})
+                      for entry_id in ids],
+        'not_found': [entry_id for entry_id in ids if entry_id not in found]
+    }), 200
+
+
+@password_bp.route('/passwords/search', methods=['GET'])
+@vault_etag
+def search_passwords():
+    '''
+    retrieves the entries having all (?match=all, the default) or any
+    (?match=any) of the blind index tokens ?t=..., see utils/search.py
+    '''
+    # authenticating a user
+    user_id = session.get('user_id')
+    if not user_id:
+        return jsonify({"error": "Unauthorized"}), 401
+
+    # Tokens as repeated ?t= parameters or comma separated
+    tokens = sorted({token for value in request.args.getlist('t')
+                     for token in value.split(',') if token})
+    if not tokens:
+        return jsonify({"error": "Missing search tokens"}), 400
+    max_tokens = current_app.config['SEARCH_MAX_QUERY_TOKENS']
+    if len(tokens) > max_tokens:
+        return jsonify({"error": f"At most {max_tokens} search tokens"}), 400
+
+    match = request.args.get('match', 'all')
+    if match not in MATCH_MODES:
+        return jsonify({"error": "match must be 'all' or 'any'"}), 400
+
+    try:
+        fields = parse_fields(request.args.get('fields'))
+    except InvalidFields as e:
+        return jsonify({"error": str(e)}), 400
+
+    in_trash = request.args.get('in_trash', 'false').lower() == 'true'
+    limit = request.args.get('limit', 50, type=int)
+    limit = max(1, min(limit, current_app.config['PASSWORDS_MAX_LIMIT']))
+
+    results = entry_query(user_id, fields).filter(
+        PasswordEntry.in_trash == in_trash,
+        PasswordEntry.id.in_(matching_entry_ids(user_id, tokens, match))
+    )
+    try:
+        page_items, next_cursor = keyset_page(
+            results, [PasswordEntry.id],
+            after=request.args.get('after'),
+            limit=limit
+        )
+    except InvalidCursor as e:
+        return jsonify({"error": str(e)}), 400
+
+    return json_response({
+        'passwords': entry_dicts(page_items, fields),
+        'limit': limit,
+        'next_cursor': next_cursor,
+        'has_next': next_cursor is not None
+    }), 200
+
+
+@password_bp.route('/passwords/health', methods=['GET'])
+@vault_etag
+def get_password_health():
+    '''
+    retrieves the groups of entries (outside the trash) sharing a
+    password, by the fingerprints clients store with them
+    '''
+    # authenticating a user
+    user_id = session.get('user_id')
+    if not user_id:
+        return jsonify({"error": "Unauthorized"}), 401
+
+    active = (PasswordEntry.user_id == user_id,
+              PasswordEntry.in_trash == false())
+
+    # Fingerprints held by more than one entry, then those entries
+    reused = db.session.query(PasswordEntry.fingerprint).filter(
+        *active, PasswordEntry.fingerprint.isnot(None)
+    ).group_by(PasswordEntry.fingerprint).having(func.count() > 1)
+    rows = db.session.query(PasswordEntry.fingerprint, PasswordEntry.id).filter(
+        *active, PasswordEntry.fingerprint.in_(reused.scalar_subquery())
+    ).order_by(PasswordEntry.fingerprint, PasswordEntry.id).all()
+
+    groups = {}
+    for fingerprint, entry_id in rows:
+        groups.setdefault(fingerprint, []).append(entry_id)
+
+    # Entries without a fingerprint cannot be checked until the client
+    # sends one
+    total, fingerprinted = db.session.query(
+        func.count(), func.count(PasswordEntry.fingerprint)
+    ).filter(*active).one()
+
+    return json_response({
+        'reuse_groups': [
+            {'fingerprint': fingerprint, 'count': len(ids), 'ids': ids}
+            for fingerprint, ids in groups.items()
+        ],
+        'reused_entries': len(rows),
+        'total_entries': total,
+        'unfingerprinted_entries': total - fingerprinted,
+    }), 200
+
+
 @password_bp.route('/password/<int:pass_ent_id>/trash', methods=['DELETE'])
 def move_to_trash(pass_ent_id):
     """
@@ -160,16 +397,23 @@ def move_to_trash(pass_ent_id):
     if not user_id:
         return jsonify({"error": "Unauthorized"}), 401
 
-    password = PasswordEntry.query.filter_by(id=pass_ent_id, user_id=user_id,
-                                             in_trash=False).first()
+    try:
+        # Bumping the sequence first locks the user's row before the
+        # entry's, in the order every vault write takes them, and the entry
+        # is then read with writes to the vault serialized
+        change_seq = next_change_seq(user_id)
+        password = PasswordEntry.query.filter_by(
+            id=pass_ent_id, user_id=user_id, in_trash=False).first()
 
-    if password is None:
-        return jsonify({"error": "Password not found"}), 404
+        if password is None:
+            db.session.rollback()
+            return jsonify({"error": "Password not found"}), 404
 
-    try:
         # moving the pass entry to trash and updating moved_at
         password.in_trash = True
         password.moved_at = func.now()
+        password.change_seq = change_seq
+        adjust_counters(user_id, active=-1, trash=1)
 
         db.session.commit()
 
@@ -194,25 +438,127 @@ def update_a_password_entry(pass_ent_id):
     # Getting the data from the request body
     data = request.get_json()
 
+    fingerprint = data.get('fingerprint')
+    if fingerprint is not None and not valid_token(fingerprint):
+        return jsonify({"error": "Invalid fingerprint"}), 400
+
+    # Blind index tokens, replaced as a whole when sent
+    search_tokens = None
+    if 'search_tokens' in data:
+        try:
+            search_tokens = parse_search_tokens(data['search_tokens'])
+        except InvalidSearchTokens as e:
+            return jsonify({"error": str(e)}), 400
+
+    # Determining updatable fields
+    updatable_fields = ['password', 'name', 'username', 'url', 'notes',
+                        'fingerprint']
+
+    # Bumping the sequence first locks the user's row before the entry's,
+    # in the order every vault write takes them
+    change_seq = next_change_seq(user_id)
+
     # Selecting the proper passwrod entry
     pass_entry = PasswordEntry.query.filter_by(id=pass_ent_id, user_id=user_id,
                                                in_trash=False).first()
 
     if not pass_entry:
+        db.session.rollback()
         return jsonify({"error": "Password entry not found"}), 404
 
-    # Determining updatable fields
-    updatable_fields = ['password', 'name', 'username', 'url', 'notes']
-
     # Update the fields existing in the request data
+    old_size = entry_size(pass_entry)
     for field in updatable_fields:
         if field in data:
             setattr(pass_entry, field, data[field])
 
-    # Update the timestamp
+    # A fingerprint of the old password would report false reuse
+    if 'password' in data and 'fingerprint' not in data:
+        pass_entry.fingerprint = None
+
+    # Update the timestamp and the sync sequence
     pass_entry.updated_at = func.now()
+    pass_entry.change_seq = change_seq
+    adjust_counters(user_id, entry_bytes=entry_size(pass_entry) - old_size)
+    if search_tokens is not None:
+        set_search_tokens(user_id, pass_entry.id, search_tokens)
 
     # Committing the changes to the database
     db.session.commit()
 
     return jsonify({"message": "Password entry updated successfully"}), 200
+
+
+@password_bp.route('/passwords/changes', methods=['GET'])
+@vault_etag
+def get_password_changes():
+    """
+    retrieves the entries created, updated, trashed or restored
+    and the ids of entries deleted since the cursor `since`
+    """
+    # authenticating a user
+    user_id = session.get('user_id')
+    if not user_id:
+        return jsonify({"error": "Unauthorized"}), 401
+
+    limit = request.args.get('limit', 100, type=int)
+    limit = max(1, min(limit, current_app.config['PASSWORDS_MAX_LIMIT']))
+
+    # The cursor holds the last sequence sent and, when that sequence was
+    # only partly sent, the last entry id sent for it. No cursor means a
+    # full sync
+    since_seq, since_id = 0, None
+    since = request.args.get('since')
+    if since:
+        try:
+            since_seq, since_id = decode_cursor(since, 2, nullable=(1,))
+        except InvalidCursor as e:
+            return jsonify({"error": str(e)}), 400
+
+    # Changes committed after this point are left for the next call
+    current_seq = db.session.query(User.change_seq).filter_by(
+        id=user_id).scalar()
+
+    after_cursor = PasswordEntry.change_seq > since_seq
+    if not since:
+        # A full sync also returns entries never stamped with a sequence
+        after_cursor = true()
+    elif since_id is not None:
+        after_cursor = or_(after_cursor, and_(
+            PasswordEntry.change_seq == since_seq,
+            PasswordEntry.id > since_id
+        ))
+
+    # change_seq rides along after the entry fields, for the cursor
+    changes = db.session.query(
+        *entry_columns(), PasswordEntry.change_seq
+    ).filter(
+        PasswordEntry.user_id == user_id,
+        PasswordEntry.change_seq <= current_seq,
+        after_cursor
+    ).order_by(PasswordEntry.change_seq, PasswordEntry.id).limit(limit + 1).all()
+
+    has_more = len(changes) > limit
+    if has_more:
+        changes = changes[:limit]
+        last = changes[-1]
+        upto_seq = last.change_seq
+        next_cursor = encode_cursor([last.change_seq, last.id])
+    else:
+        upto_seq = current_seq
+        next_cursor = encode_cursor([current_seq, None])
+
+    # Deletions never share a sequence value with entry writes, so
+    # tombstones can be sent by whole sequence values
+    deleted = db.session.query(PasswordTombstone.entry_id).filter(
+        PasswordTombstone.user_id == user_id,
+        PasswordTombstone.change_seq > since_seq,
+        PasswordTombstone.change_seq <= upto_seq
+    ).order_by(PasswordTombstone.change_seq).all()
+
+    return json_response({
+        'changes': entry_dicts(changes),
+        'deleted': [entry_id for entry_id, in deleted],
+        'next_cursor': next_cursor,
+        'has_more': has_more
+    }), 200
@@ -4,15 +4,23 @@ handling some trash page endpoints:
 restore a password entry
 delete one password permanently
 deleting all passwords permanently
+trashing, restoring or deleting many passwords at once
 """
 
 from backend.models import db
 from backend.models.password import PasswordEntry
-from flask import Blueprint, jsonify, request, session
+from backend.utils.vault import (adjust_counters, entry_size,
+                                 entry_size_column, next_change_seq,
+                                 record_deletions)
+from flask import Blueprint, current_app, jsonify, request, session
+from sqlalchemy import delete, update
 from sqlalchemy.sql import func
 
 trash_bp = Blueprint('trash', __name__)
 
+# The in_trash state an entry must be in for each bulk action
+BULK_ACTIONS = {'trash': False, 'restore': True, 'delete': True}
+
 
 @trash_bp.route('/password/<int:pass_ent_id>/restore', methods=['PATCH'])
 def restore_from_trash(pass_ent_id):
@@ -24,17 +32,24 @@ def restore_from_trash(pass_ent_id):
     if not user_id:
         return jsonify({"error": "Unauthorized"}), 401
 
-    password = PasswordEntry.query.filter_by(id=pass_ent_id, user_id=user_id,
-                                             in_trash=True).first()
+    try:
+        # Bumping the sequence first locks the user's row before the
+        # entry's, in the order every vault write takes them, and the entry
+        # is then read with writes to the vault serialized
+        change_seq = next_change_seq(user_id)
+        password = PasswordEntry.query.filter_by(
+            id=pass_ent_id, user_id=user_id, in_trash=True).first()
 
-    if password is None:
-        return jsonify({"error": "Password not found"}), 404
+        if password is None:
+            db.session.rollback()
+            return jsonify({"error": "Password not found"}), 404
 
-    try:
         # restoring the pass entry from trash and updating moved_at and updated_at
         password.in_trash = False
         password.moved_at = None
         password.updated_at = func.now()
+        password.change_seq = change_seq
+        adjust_counters(user_id, active=1, trash=-1)
 
         db.session.commit()
 
@@ -58,14 +73,22 @@ def perm_del(pass_ent_id):
     if not user_id:
         return jsonify({"error": "Unauthorized"}), 401
 
-    password = PasswordEntry.query.filter_by(id=pass_ent_id, user_id=user_id,
-                                             in_trash=True).first()
-
-    if password is None:
-        return jsonify({"error": "Password not found"}), 404
-
     try:
-        # deleting pass entry permanently
+        # Bumping the sequence first locks the user's row before the
+        # entry's, in the order every vault write takes them, and the entry
+        # is then read with writes to the vault serialized
+        change_seq = next_change_seq(user_id)
+        password = PasswordEntry.query.filter_by(
+            id=pass_ent_id, user_id=user_id, in_trash=True).first()
+
+        if password is None:
+            db.session.rollback()
+            return jsonify({"error": "Password not found"}), 404
+
+        # deleting pass entry permanently, leaving a tombstone for sync
+        record_deletions(user_id, [password.id], change_seq)
+        adjust_counters(user_id, trash=-1,
+                        entry_bytes=-entry_size(password))
         db.session.delete(password)
         db.session.commit()
 
@@ -89,15 +112,11 @@ def del_all():
     if not user_id:
         return jsonify({"error": "Unauthorized"}), 401
 
-    passwords = PasswordEntry.query.filter_by(user_id=user_id,
-                                             in_trash=True).all()
-
-    if not passwords:
-        return jsonify({"error": "No passwords to delete"}), 404
-
     try:
-        for password in passwords:
-            db.session.delete(password)
+        deleted = bulk_update(user_id, 'delete')
+        if not deleted:
+            db.session.rollback()
+            return jsonify({"error": "No passwords to delete"}), 404
         db.session.commit()
 
         return jsonify({"message":
@@ -108,3 +127,83 @@ def del_all():
         return jsonify({"error":
                         "An error occurred while deleting passwords"
                         }), 500
+
+
+@trash_bp.route('/passwords/bulk', methods=['POST'])
+def bulk_action():
+    """
+    trashes, restores or permanently deletes a set of password entries
+    (the given ids, or all the entries the action applies to)
+    in a single statement
+    """
+    # authenticating a user
+    user_id = session.get('user_id')
+    if not user_id:
+        return jsonify({"error": "Unauthorized"}), 401
+
+    data = request.get_json(silent=True) or {}
+    action = data.get('action')
+    if action not in BULK_ACTIONS:
+        return jsonify({"error": "Action must be one of: "
+                        + ", ".join(BULK_ACTIONS)}), 400
+
+    ids = None
+    if not data.get('all'):
+        ids = data.get('ids')
+        if (not isinstance(ids, list) or not ids or
+                not all(type(pass_id) is int for pass_id in ids)):
+            return jsonify({"error": "ids must be a non-empty list of ids"}), 400
+        max_ids = current_app.config['BULK_MAX_IDS']
+        if len(ids) > max_ids:
+            return jsonify({"error": f"At most {max_ids} ids are allowed"}), 400
+
+    try:
+        affected = bulk_update(user_id, action, ids)
+        db.session.commit()
+
+        return jsonify({"action": action, "affected": affected}), 200
+
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({"error":
+                        "An error occurred while updating passwords"
+                        }), 500
+
+
+def bulk_update(user_id, action, ids=None):
+    """
+    applies a bulk action to the user's entries with the given ids,
+    or to all of them when ids is None, without committing.
+    Entries not in the state the action applies to are left alone.
+    Returns the number of entries affected
+    """
+    change_seq = next_change_seq(user_id)
+    conditions = [PasswordEntry.user_id == user_id,
+                  PasswordEntry.in_trash == BULK_ACTIONS[action]]
+    if ids is not None:
+        conditions.append(PasswordEntry.id.in_(set(ids)))
+
+    if action == 'delete':
+        deleted = db.session.execute(
+            delete(PasswordEntry).where(*conditions)
+            .returning(PasswordEntry.id, entry_size_column())
+        ).all()
+        record_deletions(user_id, [entry_id for entry_id, _ in deleted],
+                         change_seq)
+        adjust_counters(user_id, trash=-len(deleted),
+                        entry_bytes=-sum(size for _, size in deleted))
+        return len(deleted)
+
+    if action == 'trash':
+        values = {'in_trash': True, 'moved_at': func.now()}
+    else:
+        values = {'in_trash': False, 'moved_at': None,
+                  'updated_at': func.now()}
+    result = db.session.execute(
+        update(PasswordEntry).where(*conditions)
+        .values(change_seq=change_seq, **values)
+        .execution_options(synchronize_session=False)
+    )
+    moved = result.rowcount if action == 'trash' else -result.rowcount
+    adjust_counters(user_id, active=-moved, trash=moved)
+    return result.rowcount
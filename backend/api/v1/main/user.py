@@ -3,10 +3,12 @@ from flask import Blueprint, jsonify, session, request
 from backend.models.user import User
 from sqlalchemy import func
 from backend.models import db
+from backend.utils.vault import next_change_seq, vault_etag
 
 user_bp = Blueprint('user', __name__)
 
 @user_bp.route('/user', methods=['GET'], strict_slashes=False)
+@vault_etag
 def get_user():
     '''retrieving user data'''
     user_id = session.get('user_id')
@@ -42,6 +44,7 @@ def update_user():
             user.email = data['email']
 
         user.updated_at = func.now()
+        next_change_seq(user_id)
 
         db.session.commit()
         return jsonify({"message": "User updated successfully"}), 200
@@ -0,0 +1,60 @@
+#!/usr/bin/python3
+"""
+handling /vault endpoints that
+serve a user's vault as a whole
+"""
+
+from backend.models import db
+from backend.models.user import User
+from backend.utils.snapshots import get_snapshot
+from backend.utils.vault import vault_etag
+from flask import Blueprint, current_app, jsonify, session
+
+vault_bp = Blueprint('vault', __name__)
+
+
+@vault_bp.route('/vault/snapshot', methods=['GET'])
+@vault_etag
+def get_vault_snapshot():
+    '''retrieves every password entry of a user in one response'''
+    if not current_app.config['VAULT_SNAPSHOTS']:
+        return jsonify({"error": "Not found"}), 404
+
+    # authenticating a user
+    user_id = session.get('user_id')
+    if not user_id:
+        return jsonify({"error": "Unauthorized"}), 401
+
+    snapshot = get_snapshot(user_id)
+    if snapshot is None:
+        return jsonify({"error": "Unauthorized"}), 401
+    change_seq, data = snapshot
+
+    # The stored array is sent as it is, without decoding it
+    body = b'{"change_seq":%d,"passwords":%s}' % (change_seq, data)
+    return current_app.response_class(body, mimetype='application/json'), 200
+
+
+@vault_bp.route('/vault/stats', methods=['GET'])
+@vault_etag
+def get_vault_stats():
+    '''retrieves the entry counts and data size of a user's vault'''
+    # authenticating a user
+    user_id = session.get('user_id')
+    if not user_id:
+        return jsonify({"error": "Unauthorized"}), 401
+
+    # Read from the counters on the user's row, see backend.utils.vault
+    stats = db.session.query(
+        User.active_count, User.trash_count, User.entry_bytes, User.change_seq
+    ).filter_by(id=user_id).first()
+    if stats is None:
+        return jsonify({"error": "Unauthorized"}), 401
+
+    return jsonify({
+        'active': stats.active_count,
+        'trash': stats.trash_count,
+        'total': stats.active_count + stats.trash_count,
+        'entry_bytes': stats.entry_bytes,
+        'change_seq': stats.change_seq
+    }), 200
@@ -0,0 +1,4 @@
+#!/usr/bin/python3
+"""
+Load/benchmark harness for the API, see `python -m backend.benchmarks.run -h`
+"""
@@ -0,0 +1,295 @@
+#!/usr/bin/python3
+"""
+Drives a mix of API calls against an app built by create_app() on a local
+database and prints latency percentiles, throughput and peak RSS as JSON.
+
+    python -m backend.benchmarks.run --db sqlite:////tmp/bench.db \\
+        --users 4 --entries 10000 --threads 8 --duration 30 --out bench.json
+
+Requests go through Flask's test client, in process, so the numbers
+measure the app and the database rather than the network. Runs with the
+same arguments and --seed issue the same sequence of calls per thread,
+so reports can be compared across commits.
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import resource
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from collections import defaultdict
+from backend.api.v1.app import create_app
+from backend.benchmarks.seed import BENCH_PASSWORD, fake_entry, seed
+from backend.config import Config
+
+# Relative weight of each operation in the default mix
+DEFAULT_MIX = {
+    'login': 2,
+    'list_cursor': 25,
+    'list_offset': 10,
+    'get': 25,
+    'create': 10,
+    'update': 10,
+    'trash_restore': 8,
+    'delete': 4,
+    'import': 3,
+    'export': 1,
+}
+
+
+def benchmark_config(args):
+    """The app configuration used for a run"""
+    class BenchmarkConfig(Config):
+        TESTING = True
+        SECRET_KEY = 'benchmark'
+        SQLALCHEMY_DATABASE_URI = args.db
+        SESSION_COOKIE_SECURE = False
+        SESSION_SWEEP_INTERVAL = 0
+        TRASH_PURGE_INTERVAL = 0
+        RATELIMIT_ENABLED = False
+        BCRYPT_LOG_ROUNDS = args.bcrypt_rounds
+        BCRYPT_POOL_SIZE = args.bcrypt_pool
+        JOBS_DIR = tempfile.mkdtemp(prefix='passkeyper-bench-')
+        CLIENT_ADDRESS = 'http://localhost'
+    return BenchmarkConfig
+
+
+class Worker:
+    """One client thread, logged in as one user, running the mix"""
+
+    def __init__(self, app, email, ids, mix, rng, import_size):
+        self.client = app.test_client()
+        self.email = email
+        self.ids = ids
+        self.created = []
+        self.rng = rng
+        self.import_size = import_size
+        self.operations = list(mix)
+        self.weights = [mix[name] for name in self.operations]
+        # operation -> [(seconds, status)]
+        self.samples = defaultdict(list)
+
+    def timed(self, operation, func, *args, **kwargs):
+        start = time.perf_counter()
+        response = func(*args, **kwargs)
+        # Read streamed bodies fully, as a client would
+        body = response.get_data()
+        self.samples[operation].append(
+            (time.perf_counter() - start, response.status_code))
+        response.close()
+        return response, body
+
+    def login(self):
+        self.timed('login', self.client.post, '/login',
+                   json={'email': self.email, 'password': BENCH_PASSWORD})
+
+    def list_cursor(self):
+        params = {'limit': 50}
+        for _ in range(3):
+            response, _ = self.timed('list_cursor', self.client.get,
+                                     '/passwords', query_string=params)
+            cursor = (response.get_json() or {}).get('next_cursor')
+            if not cursor:
+                return
+            params['after'] = cursor
+
+    def list_offset(self):
+        page = self.rng.randint(1, max(1, len(self.ids) // 50))
+        self.timed('list_offset', self.client.get, '/passwords',
+                   query_string={'page': page, 'per_page': 50})
+
+    def get(self):
+        pass_id = self.rng.choice(self.ids)
+        self.timed('get', self.client.get, f'/password/{pass_id}')
+
+    def create(self):
+        response, _ = self.timed('create', self.client.post, '/password',
+                                 json=fake_entry(self.rng))
+        if response.status_code == 201:
+            message = response.get_json()['message']
+            self.created.append(int(message.rsplit(' ', 1)[-1]))
+
+    def update(self):
+        pass_id = self.rng.choice(self.ids)
+        self.timed('update', self.client.patch, f'/password/{pass_id}',
+                   json={'notes': fake_entry(self.rng)['username']})
+
+    def trash_restore(self):
+        pass_id = self.rng.choice(self.ids)
+        self.timed('trash', self.client.delete, f'/password/{pass_id}/trash')
+        self.timed('restore', self.client.patch,
+                   f'/password/{pass_id}/restore')
+
+    def delete(self):
+        # Only entries made by this run, so the seeded vault keeps its size
+        if not self.created:
+            return self.create()
+        pass_id = self.created.pop()
+        self.timed('trash', self.client.delete, f'/password/{pass_id}/trash')
+        self.timed('delete', self.client.delete,
+                   f'/password/{pass_id}/permanent')
+
+    def import_(self):
+        entries = [fake_entry(self.rng) for _ in range(self.import_size)]
+        self.timed('import', self.client.post, '/import', json=entries)
+
+    def export(self):
+        self.timed('export', self.client.get, '/export',
+                   query_string={'fileType': 'ndjson'})
+
+    def run(self, deadline, max_requests):
+        self.login()
+        done = 0
+        while time.perf_counter() < deadline and done < max_requests:
+            operation = self.rng.choices(self.operations, self.weights)[0]
+            getattr(self, 'import_' if operation == 'import' else operation)()
+            done += 1
+
+
+def percentile(sorted_values, fraction):
+    """Nearest-rank percentile of an already sorted list"""
+    if not sorted_values:
+        return None
+    rank = max(0, int(round(fraction * len(sorted_values) + 0.5)) - 1)
+    return sorted_values[min(rank, len(sorted_values) - 1)]
+
+
+def summarize(samples, elapsed):
+    """Counts, error counts, throughput and latency percentiles in ms"""
+    latencies = sorted(seconds for seconds, _ in samples)
+    statuses = defaultdict(int)
+    for _, status in samples:
+        statuses[str(status)] += 1
+    return {
+        'count': len(samples),
+        'errors': sum(1 for _, status in samples if status >= 500),
+        'statuses': dict(sorted(statuses.items())),
+        'throughput_rps': round(len(samples) / elapsed, 2) if elapsed else None,
+        'p50_ms': round(percentile(latencies, 0.50) * 1000, 3) if latencies else None,
+        'p95_ms': round(percentile(latencies, 0.95) * 1000, 3) if latencies else None,
+        'p99_ms': round(percentile(latencies, 0.99) * 1000, 3) if latencies else None,
+        'max_ms': round(latencies[-1] * 1000, 3) if latencies else None,
+    }
+
+
+def peak_rss_mb():
+    """Peak resident set size of this process"""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in bytes on macOS and in kilobytes elsewhere
+    if sys.platform == 'darwin':
+        return round(peak / (1024 * 1024), 1)
+    return round(peak / 1024, 1)
+
+
+def git_commit():
+    try:
+        return subprocess.check_output(
+            ['git', 'rev-parse', 'HEAD'], stderr=subprocess.DEVNULL,
+            cwd=os.path.dirname(os.path.abspath(__file__))
+        ).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def parse_mix(text):
+    mix = dict(DEFAULT_MIX)
+    if text:
+        for item in text.split(','):
+            name, weight = item.split('=')
+            if name not in DEFAULT_MIX:
+                raise argparse.ArgumentTypeError(f"Unknown operation: {name}")
+            mix[name] = float(weight)
+    return {name: weight for name, weight in mix.items() if weight > 0}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--db', default='sqlite:///' + os.path.join(
+        tempfile.gettempdir(), 'passkeyper-bench.db'),
+        help='database URI; its tables are dropped and recreated')
+    parser.add_argument('--users', type=int, default=4)
+    parser.add_argument('--entries', type=int, default=10000,
+                        help='entries per user')
+    parser.add_argument('--threads', type=int, default=8)
+    parser.add_argument('--duration', type=float, default=30,
+                        help='seconds to run for')
+    parser.add_argument('--requests', type=int, default=10 ** 9,
+                        help='operations per thread, at most')
+    parser.add_argument('--mix', type=parse_mix, default=dict(DEFAULT_MIX),
+                        help='weights, e.g. get=50,export=0')
+    parser.add_argument('--import-size', type=int, default=100,
+                        help='entries per /import call')
+    parser.add_argument('--bcrypt-rounds', type=int, default=10)
+    parser.add_argument('--bcrypt-pool', type=int, default=0)
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--out', help='write the JSON report to this file')
+    args = parser.parse_args(argv)
+
+    app = create_app(benchmark_config(args))
+    rng = random.Random(args.seed)
+
+    with app.app_context():
+        start = time.perf_counter()
+        accounts = seed(rng, args.users, args.entries)
+        seed_seconds = time.perf_counter() - start
+
+    workers = [
+        Worker(app, *accounts[number % len(accounts)], args.mix,
+               random.Random(rng.random()), args.import_size)
+        for number in range(args.threads)
+    ]
+    start = time.perf_counter()
+    deadline = start + args.duration
+    threads = [threading.Thread(target=worker.run,
+                                args=(deadline, args.requests))
+               for worker in workers]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+
+    by_operation = defaultdict(list)
+    for worker in workers:
+        for operation, samples in worker.samples.items():
+            by_operation[operation].extend(samples)
+    every_sample = [sample for samples in by_operation.values()
+                    for sample in samples]
+
+    report = {
+        'meta': {
+            'commit': git_commit(),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'database': app.config['SQLALCHEMY_DATABASE_URI'].split(':')[0],
+            'users': args.users,
+            'entries_per_user': args.entries,
+            'threads': args.threads,
+            'duration_s': args.duration,
+            'mix': args.mix,
+            'seed': args.seed,
+        },
+        'seed_seconds': round(seed_seconds, 3),
+        'elapsed_seconds': round(elapsed, 3),
+        'overall': summarize(every_sample, elapsed),
+        'operations': {
+            operation: summarize(samples, elapsed)
+            for operation, samples in sorted(by_operation.items())
+        },
+        'peak_rss_mb': peak_rss_mb(),
+    }
+
+    output = json.dumps(report, indent=2)
+    if args.out:
+        with open(args.out, 'w') as report_file:
+            report_file.write(output + '\n')
+    print(output)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,86 @@
+#!/usr/bin/python3
+"""Synthetic users and vault entries for the benchmarks"""
+import base64
+from datetime import datetime, timedelta, timezone
+from backend.models import db
+from backend.models.password import PasswordEntry
+from backend.models.user import User
+from backend.utils.hashing import hasher
+from backend.utils.vault import entry_size
+from sqlalchemy import insert, select
+
+BENCH_PASSWORD = 'benchmark-master-password'
+
+
+def ciphertext(rng, size):
+    """
+    Random base64 shaped like the client's AES-GCM output
+    (12 byte IV + ciphertext + 16 byte tag) for a plaintext of `size` bytes
+    """
+    return base64.b64encode(rng.randbytes(12 + size + 16)).decode('ascii')
+
+
+def fake_entry(rng):
+    """A password entry as the client would send it"""
+    return {
+        'name': ciphertext(rng, rng.randint(6, 24)),
+        'username': ciphertext(rng, rng.randint(8, 32)),
+        'password': ciphertext(rng, rng.randint(12, 40)),
+        'url': ciphertext(rng, rng.randint(15, 60)),
+        'favicon_url': None,
+        'notes': ciphertext(rng, rng.randint(0, 300)) if rng.random() < 0.3 else None,
+    }
+
+
+def seed(rng, users, entries_per_user, trash_ratio=0.1, batch_size=5000):
+    """
+    Recreates the schema and fills it with `users` users holding
+    `entries_per_user` entries each, a share of them in the trash.
+    Returns [(email, [entry ids])].
+    """
+    db.drop_all()
+    db.create_all()
+
+    # One hash serves every user, the cost is paid at login time
+    hashed = hasher.generate(BENCH_PASSWORD)
+    now = datetime.now(timezone.utc)
+    accounts = []
+    for number in range(users):
+        user = User(email=f'bench{number}@example.com',
+                    username=f'bench{number}',
+                    hashed_master_password=hashed,
+                    ek_salt=ciphertext(rng, 16),
+                    change_seq=1)
+        db.session.add(user)
+        db.session.commit()
+
+        rows = []
+        for _ in range(entries_per_user):
+            row = fake_entry(rng)
+            in_trash = rng.random() < trash_ratio
+            # Entry counters, as the API routes keep them
+            if in_trash:
+                user.trash_count += 1
+            else:
+                user.active_count += 1
+            user.entry_bytes += entry_size(row)
+            row.update({
+                'user_id': user.id,
+                'in_trash': in_trash,
+                'moved_at': now - timedelta(days=rng.randint(0, 60)) if in_trash else None,
+                'created_at': now - timedelta(days=rng.randint(0, 900)),
+                'change_seq': 1,
+            })
+            rows.append(row)
+            if len(rows) == batch_size:
+                db.session.execute(insert(PasswordEntry), rows)
+                rows = []
+        if rows:
+            db.session.execute(insert(PasswordEntry), rows)
+        db.session.commit()
+
+        ids = db.session.execute(
+            select(PasswordEntry.id).where(PasswordEntry.user_id == user.id)
+        ).scalars().all()
+        accounts.append((user.email, list(ids)))
+    return accounts
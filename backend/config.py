@@ -1,5 +1,6 @@
 #!/usr/bin/python3
 import os
+import tempfile
 from dotenv import load_dotenv
 from datetime import timedelta
 
@@ -12,12 +13,150 @@ class Config:
     SQLALCHEMY_DATABASE_URI = os.getenv("DATABASE_URI_STRING")
     SQLALCHEMY_TRACK_MODIFICATIONS = False
 
+    # 'sql' keeps sessions in the user_sessions table (backend.utils.sessions),
+    # any other value uses Flask-Session with SESSION_TYPE
+    SESSION_STORE = os.getenv("SESSION_STORE", "sql")
     SESSION_TYPE = 'filesystem'
+    # In-process cache in front of user_sessions: entries, and seconds a
+    # cached session is trusted before it is read again (so a logout can
+    # take that long to reach the other worker processes)
+    SESSION_CACHE_SIZE = int(os.getenv("SESSION_CACHE_SIZE", 10000))
+    SESSION_CACHE_TTL = int(os.getenv("SESSION_CACHE_TTL", 15))
+    # Seconds between expiry refreshes of an unchanged session
+    SESSION_REFRESH_INTERVAL = int(os.getenv("SESSION_REFRESH_INTERVAL", 60))
+    # Seconds between sweeps of expired sessions by serving processes (0
+    # disables the sweeper, `flask session_cleanup` still works), and rows
+    # deleted per statement
+    SESSION_SWEEP_INTERVAL = int(os.getenv("SESSION_SWEEP_INTERVAL", 300))
+    SESSION_SWEEP_BATCH_SIZE = int(os.getenv("SESSION_SWEEP_BATCH_SIZE", 500))
     SESSION_PERMANENT = False
     PERMANENT_SESSION_LIFETIME = timedelta(minutes=30)
     SESSION_COOKIE_SAMESITE = 'None'  # Use 'Lax' if you only need first-party cookies
     SESSION_COOKIE_SECURE = True # change to false to allow http reqs via postman
 
+    # Largest page a client may request in /passwords cursor mode
+    PASSWORDS_MAX_LIMIT = int(os.getenv("PASSWORDS_MAX_LIMIT", 1000))
+
+    # Most ids accepted by one GET /passwords?ids= request
+    PASSWORDS_MAX_IDS = int(os.getenv("PASSWORDS_MAX_IDS", 500))
+
+    # Most ids accepted by one POST /passwords/bulk request
+    BULK_MAX_IDS = int(os.getenv("BULK_MAX_IDS", 10000))
+
+    # Most entries accepted by one POST /passwords/batch request, and
+    # whether one invalid entry fails the whole batch unless the request
+    # says otherwise with ?atomic=
+    PASSWORDS_BATCH_MAX = int(os.getenv("PASSWORDS_BATCH_MAX", 500))
+    PASSWORDS_BATCH_ATOMIC = os.getenv(
+        "PASSWORDS_BATCH_ATOMIC", "true").lower() == "true"
+
+    # Rows read per round trip when streaming /export
+    EXPORT_BATCH_SIZE = int(os.getenv("EXPORT_BATCH_SIZE", 500))
+
+    # Largest /import body accepted, and entries inserted per transaction
+    IMPORT_MAX_BYTES = int(os.getenv("IMPORT_MAX_BYTES", 64 * 1024 * 1024))
+    IMPORT_BATCH_SIZE = int(os.getenv("IMPORT_BATCH_SIZE", 1000))
+
+    # Background import/export jobs (?async=1): worker threads, unfinished
+    # jobs allowed at once, seconds results are kept, seconds between
+    # sweeps of expired ones, and where files go. Jobs live in the memory
+    # of one process, see backend.utils.jobs
+    JOBS_MAX_WORKERS = int(os.getenv("JOBS_MAX_WORKERS", 2))
+    JOBS_MAX_PENDING = int(os.getenv("JOBS_MAX_PENDING", 16))
+    JOBS_RESULT_TTL = int(os.getenv("JOBS_RESULT_TTL", 3600))
+    JOBS_GC_INTERVAL = int(os.getenv("JOBS_GC_INTERVAL", 300))
+    JOBS_DIR = os.getenv(
+        "JOBS_DIR", os.path.join(tempfile.gettempdir(), "passkeyper-jobs"))
+
+    # bcrypt cost of new master password hashes, the same on every node
+    # (`flask bcrypt-calibrate` suggests one for a target hashing time).
+    # Existing hashes keep theirs: clients derive vault keys from them
+    BCRYPT_LOG_ROUNDS = int(os.getenv("BCRYPT_LOG_ROUNDS", 12))
+    # Hashing processes (0 hashes on the request thread), hashes allowed
+    # to wait for one, and seconds to wait before answering 503
+    BCRYPT_POOL_SIZE = int(os.getenv("BCRYPT_POOL_SIZE", 2))
+    BCRYPT_MAX_PENDING = int(os.getenv("BCRYPT_MAX_PENDING", 32))
+    BCRYPT_QUEUE_TIMEOUT = float(os.getenv("BCRYPT_QUEUE_TIMEOUT", 5))
+
+    # Rate limits of the auth routes, as "<attempts>/<seconds>" per client
+    # IP and per email address (empty disables a limit), the most buckets
+    # kept in memory, and an optional RateLimitBackend class import path
+    RATELIMIT_ENABLED = os.getenv("RATELIMIT_ENABLED", "true").lower() == "true"
+    RATELIMIT_LOGIN_PER_IP = os.getenv("RATELIMIT_LOGIN_PER_IP", "20/60")
+    RATELIMIT_LOGIN_PER_EMAIL = os.getenv("RATELIMIT_LOGIN_PER_EMAIL", "5/60")
+    RATELIMIT_SIGNUP_PER_IP = os.getenv("RATELIMIT_SIGNUP_PER_IP", "5/60")
+    RATELIMIT_SIGNUP_PER_EMAIL = os.getenv("RATELIMIT_SIGNUP_PER_EMAIL", "3/60")
+    RATELIMIT_CALLBACK_PER_IP = os.getenv("RATELIMIT_CALLBACK_PER_IP", "20/60")
+    RATELIMIT_MAX_KEYS = int(os.getenv("RATELIMIT_MAX_KEYS", 100000))
+    RATELIMIT_BACKEND = os.getenv("RATELIMIT_BACKEND")
+
+    # Per-request SQL statistics in a Server-Timing header and in the
+    # "passkeyper.sql" log: slowest statements listed, and how many runs
+    # of the same statement in one request are reported as N+1
+    SQL_INSTRUMENTATION = os.getenv("SQL_INSTRUMENTATION", "false").lower() == "true"
+    SQL_INSTRUMENTATION_SLOWEST = int(os.getenv("SQL_INSTRUMENTATION_SLOWEST", 3))
+    SQL_N_PLUS_ONE_THRESHOLD = int(os.getenv("SQL_N_PLUS_ONE_THRESHOLD", 10))
+
+    # Bearer token required by /metrics, which is disabled when unset
+    METRICS_TOKEN = os.getenv("METRICS_TOKEN")
+
+    # Compress responses the client accepts compressed (gzip, and br/zstd
+    # when the brotli/zstandard packages are installed)
+    COMPRESS_ENABLED = os.getenv("COMPRESS_ENABLED", "true").lower() == "true"
+    # Encodings offered, preferred first when the client has no preference
+    COMPRESS_ALGORITHMS = os.getenv("COMPRESS_ALGORITHMS", "zstd,br,gzip")
+    # Buffered responses smaller than this (bytes) are sent uncompressed
+    COMPRESS_MIN_SIZE = int(os.getenv("COMPRESS_MIN_SIZE", 1024))
+    COMPRESS_MIMETYPES = os.getenv(
+        "COMPRESS_MIMETYPES",
+        "application/json,application/x-ndjson,text/csv,text/plain,text/html"
+    )
+    COMPRESS_GZIP_LEVEL = int(os.getenv("COMPRESS_GZIP_LEVEL", 6))
+    COMPRESS_BR_LEVEL = int(os.getenv("COMPRESS_BR_LEVEL", 4))
+    COMPRESS_ZSTD_LEVEL = int(os.getenv("COMPRESS_ZSTD_LEVEL", 3))
+
+    # Keep a materialized snapshot of each vault and serve it whole
+    # from /vault/snapshot
+    VAULT_SNAPSHOTS = os.getenv("VAULT_SNAPSHOTS", "false").lower() == "true"
+
+    # Entries in the trash for longer than this many days are deleted
+    # (0, the default, keeps them), checked every TRASH_PURGE_INTERVAL
+    # seconds by serving processes (0 leaves it to `flask trash-purge`),
+    # TRASH_PURGE_BATCH_SIZE entries per transaction with
+    # TRASH_PURGE_PAUSE seconds between transactions
+    TRASH_RETENTION_DAYS = int(os.getenv("TRASH_RETENTION_DAYS", 0))
+    TRASH_PURGE_INTERVAL = int(os.getenv("TRASH_PURGE_INTERVAL", 0))
+    TRASH_PURGE_BATCH_SIZE = int(os.getenv("TRASH_PURGE_BATCH_SIZE", 200))
+    TRASH_PURGE_PAUSE = float(os.getenv("TRASH_PURGE_PAUSE", 0.1))
+
+    # Blind index search: tokens stored per entry, and per search
+    SEARCH_MAX_ENTRY_TOKENS = int(os.getenv("SEARCH_MAX_ENTRY_TOKENS", 512))
+    SEARCH_MAX_QUERY_TOKENS = int(os.getenv("SEARCH_MAX_QUERY_TOKENS", 32))
+
+    # Breach data file built by `flask breach-build` from a Pwned
+    # Passwords SHA-1 dump; /breach answers 503 until it exists
+    BREACH_DATA_PATH = os.getenv("BREACH_DATA_PATH")
+    # Prefixes per /breach/ranges request
+    BREACH_MAX_PREFIXES = int(os.getenv("BREACH_MAX_PREFIXES", 100))
+
+    # Favicons resolved per host by the server: where the icons are kept,
+    # the URL they are fetched from ({host} is filled in), or another
+    # FaviconFetcher class to fetch them with
+    FAVICON_DIR = os.getenv(
+        "FAVICON_DIR", os.path.join(tempfile.gettempdir(), "passkeyper-favicons"))
+    FAVICON_UPSTREAM = os.getenv(
+        "FAVICON_UPSTREAM", "https://icons.duckduckgo.com/ip3/{host}.ico")
+    FAVICON_FETCHER = os.getenv("FAVICON_FETCHER")
+    FAVICON_TIMEOUT = float(os.getenv("FAVICON_TIMEOUT", 5))
+    FAVICON_MAX_BYTES = int(os.getenv("FAVICON_MAX_BYTES", 100 * 1024))
+    FAVICON_MAX_WORKERS = int(os.getenv("FAVICON_MAX_WORKERS", 8))
+    FAVICON_MAX_BATCH = int(os.getenv("FAVICON_MAX_BATCH", 100))
+    # Seconds before a host is resolved again, with and without an icon
+    FAVICON_TTL = int(os.getenv("FAVICON_TTL", 7 * 24 * 3600))
+    FAVICON_NEGATIVE_TTL = int(os.getenv("FAVICON_NEGATIVE_TTL", 24 * 3600))
+    # Icons kept in memory
+    FAVICON_CACHE_SIZE = int(os.getenv("FAVICON_CACHE_SIZE", 1000))
+
     CLIENT_ADDRESS = os.getenv("CLIENT_ADDRESS")
     CLIENT_ID = os.getenv("CLIENT_ID")
     CLIENT_SECRET = os.getenv("CLIENT_SECRET")
@@ -0,0 +1,28 @@
+"""Added keyset pagination indexes to password_entries
+
+Revision ID: 44f5f74a90aa
+Revises: 5285b2ca6a78
+Create Date: 2026-10-18 09:12:40.512306
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '44f5f74a90aa'
+down_revision = '5285b2ca6a78'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('password_entries', schema=None) as batch_op:
+        batch_op.create_index('ix_password_entries_user_trash_id', ['user_id', 'in_trash', 'id'], unique=False)
+        batch_op.create_index('ix_password_entries_user_trash_moved_at', ['user_id', 'in_trash', 'moved_at'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('password_entries', schema=None) as batch_op:
+        batch_op.drop_index('ix_password_entries_user_trash_moved_at')
+        batch_op.drop_index('ix_password_entries_user_trash_id')
@@ -0,0 +1,52 @@
+"""Added entry counters to users
+
+Revision ID: 5497781a973a
+Revises: 6585253f54cf
+Create Date: 2026-10-18 17:12:08.604127
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '5497781a973a'
+down_revision = '6585253f54cf'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('users', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('active_count', sa.Integer(), server_default='0', nullable=False))
+        batch_op.add_column(sa.Column('trash_count', sa.Integer(), server_default='0', nullable=False))
+        batch_op.add_column(sa.Column('entry_bytes', sa.BigInteger(), server_default='0', nullable=False))
+
+    # Backfilling the counters from the existing entries; in_trash is
+    # nullable, and NULL counts as not trashed, as in `flask vault-recount`
+    op.execute("""
+        UPDATE users SET
+            active_count = (
+                SELECT COUNT(*) FROM password_entries
+                WHERE password_entries.user_id = users.id
+                AND COALESCE(password_entries.in_trash, false) = false),
+            trash_count = (
+                SELECT COUNT(*) FROM password_entries
+                WHERE password_entries.user_id = users.id
+                AND COALESCE(password_entries.in_trash, false) = true),
+            entry_bytes = (
+                SELECT COALESCE(SUM(
+                    COALESCE(LENGTH(name), 0) + COALESCE(LENGTH(username), 0)
+                    + COALESCE(LENGTH(password), 0) + COALESCE(LENGTH(url), 0)
+                    + COALESCE(LENGTH(favicon_url), 0)
+                    + COALESCE(LENGTH(notes), 0)), 0)
+                FROM password_entries
+                WHERE password_entries.user_id = users.id)
+    """)
+
+
+def downgrade():
+    with op.batch_alter_table('users', schema=None) as batch_op:
+        batch_op.drop_column('entry_bytes')
+        batch_op.drop_column('trash_count')
+        batch_op.drop_column('active_count')
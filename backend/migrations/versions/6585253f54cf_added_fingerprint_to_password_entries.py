@@ -0,0 +1,28 @@
+"""Added fingerprint to password_entries
+
+Revision ID: 6585253f54cf
+Revises: 7c98cd5a8b7e
+Create Date: 2026-10-18 15:41:55.372019
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '6585253f54cf'
+down_revision = '7c98cd5a8b7e'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('password_entries', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('fingerprint', sa.String(length=64), nullable=True))
+        batch_op.create_index('ix_password_entries_user_fingerprint', ['user_id', 'fingerprint'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('password_entries', schema=None) as batch_op:
+        batch_op.drop_index('ix_password_entries_user_fingerprint')
+        batch_op.drop_column('fingerprint')
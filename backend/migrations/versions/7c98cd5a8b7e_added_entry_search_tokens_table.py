@@ -0,0 +1,39 @@
+"""Added entry_search_tokens table
+
+Revision ID: 7c98cd5a8b7e
+Revises: 976d899a77b6
+Create Date: 2026-10-18 15:04:12.448590
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '7c98cd5a8b7e'
+down_revision = '976d899a77b6'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('entry_search_tokens',
+    sa.Column('id', sa.Integer(), autoincrement=True, nullable=False),
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.Column('entry_id', sa.Integer(), nullable=False),
+    sa.Column('token', sa.String(length=64), nullable=False),
+    sa.ForeignKeyConstraint(['entry_id'], ['password_entries.id'], ondelete='CASCADE'),
+    sa.ForeignKeyConstraint(['user_id'], ['users.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+    with op.batch_alter_table('entry_search_tokens', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_entry_search_tokens_entry_id'), ['entry_id'], unique=False)
+        batch_op.create_index('ix_entry_search_tokens_user_token', ['user_id', 'token', 'entry_id'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('entry_search_tokens', schema=None) as batch_op:
+        batch_op.drop_index('ix_entry_search_tokens_user_token')
+        batch_op.drop_index(batch_op.f('ix_entry_search_tokens_entry_id'))
+
+    op.drop_table('entry_search_tokens')
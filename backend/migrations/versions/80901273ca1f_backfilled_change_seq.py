@@ -0,0 +1,28 @@
+"""Backfilled change_seq of entries written before it existed
+
+Revision ID: 80901273ca1f
+Revises: 5497781a973a
+Create Date: 2026-10-18 18:02:44.190357
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '80901273ca1f'
+down_revision = '5497781a973a'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Entries never stamped with a sequence count as the first write to
+    # their vault, so the first delta sync (changes after 0) returns them
+    op.execute("UPDATE password_entries SET change_seq = 1 WHERE change_seq = 0")
+    op.execute("UPDATE users SET change_seq = 1 WHERE change_seq = 0")
+
+
+def downgrade():
+    # Nothing to undo: the values are valid sequence numbers either way
+    pass
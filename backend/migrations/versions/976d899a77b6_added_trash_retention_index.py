@@ -0,0 +1,26 @@
+"""Added trash retention index
+
+Revision ID: 976d899a77b6
+Revises: f5ba1fa4aa70
+Create Date: 2026-10-18 14:20:36.817350
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '976d899a77b6'
+down_revision = 'f5ba1fa4aa70'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('password_entries', schema=None) as batch_op:
+        batch_op.create_index('ix_password_entries_trash_moved_at', ['in_trash', 'moved_at'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('password_entries', schema=None) as batch_op:
+        batch_op.drop_index('ix_password_entries_trash_moved_at')
@@ -0,0 +1,51 @@
+"""Added change sequence columns and password_tombstones table
+
+Revision ID: a1e0d37bba63
+Revises: 44f5f74a90aa
+Create Date: 2026-10-18 10:02:17.834519
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a1e0d37bba63'
+down_revision = '44f5f74a90aa'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('password_tombstones',
+    sa.Column('id', sa.Integer(), autoincrement=True, nullable=False),
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.Column('entry_id', sa.Integer(), nullable=False),
+    sa.Column('change_seq', sa.Integer(), nullable=False),
+    sa.Column('deleted_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=True),
+    sa.ForeignKeyConstraint(['user_id'], ['users.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+    with op.batch_alter_table('password_tombstones', schema=None) as batch_op:
+        batch_op.create_index('ix_password_tombstones_user_seq', ['user_id', 'change_seq'], unique=False)
+
+    with op.batch_alter_table('users', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('change_seq', sa.Integer(), server_default='0', nullable=False))
+
+    with op.batch_alter_table('password_entries', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('change_seq', sa.Integer(), server_default='0', nullable=False))
+        batch_op.create_index('ix_password_entries_user_change_seq', ['user_id', 'change_seq'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('password_entries', schema=None) as batch_op:
+        batch_op.drop_index('ix_password_entries_user_change_seq')
+        batch_op.drop_column('change_seq')
+
+    with op.batch_alter_table('users', schema=None) as batch_op:
+        batch_op.drop_column('change_seq')
+
+    with op.batch_alter_table('password_tombstones', schema=None) as batch_op:
+        batch_op.drop_index('ix_password_tombstones_user_seq')
+
+    op.drop_table('password_tombstones')
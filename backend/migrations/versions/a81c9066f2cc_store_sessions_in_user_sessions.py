@@ -0,0 +1,40 @@
+"""Store server-side sessions in user_sessions
+
+Revision ID: a81c9066f2cc
+Revises: a1e0d37bba63
+Create Date: 2026-10-18 11:41:05.203917
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a81c9066f2cc'
+down_revision = 'a1e0d37bba63'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('user_sessions', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('data', sa.LargeBinary(), nullable=True))
+        batch_op.add_column(sa.Column('expiry', sa.DateTime(timezone=True), nullable=True))
+        batch_op.alter_column('user_id',
+               existing_type=sa.Integer(),
+               nullable=True)
+        batch_op.create_index(batch_op.f('ix_user_sessions_session_id'), ['session_id'], unique=True)
+        batch_op.create_index(batch_op.f('ix_user_sessions_expiry'), ['expiry'], unique=False)
+
+
+def downgrade():
+    # Sessions that never logged in have no user and cannot be kept
+    op.execute('DELETE FROM user_sessions WHERE user_id IS NULL')
+    with op.batch_alter_table('user_sessions', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_user_sessions_expiry'))
+        batch_op.drop_index(batch_op.f('ix_user_sessions_session_id'))
+        batch_op.alter_column('user_id',
+               existing_type=sa.Integer(),
+               nullable=False)
+        batch_op.drop_column('expiry')
+        batch_op.drop_column('data')
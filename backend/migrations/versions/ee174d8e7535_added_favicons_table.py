@@ -0,0 +1,35 @@
+"""Added favicons table
+
+Revision ID: ee174d8e7535
+Revises: a81c9066f2cc
+Create Date: 2026-10-18 13:02:47.581306
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'ee174d8e7535'
+down_revision = 'a81c9066f2cc'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('favicons',
+    sa.Column('id', sa.Integer(), autoincrement=True, nullable=False),
+    sa.Column('host', sa.String(length=255), nullable=False),
+    sa.Column('content_hash', sa.String(length=64), nullable=True),
+    sa.Column('resolved_at', sa.DateTime(timezone=True), nullable=False),
+    sa.PrimaryKeyConstraint('id')
+    )
+    with op.batch_alter_table('favicons', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_favicons_host'), ['host'], unique=True)
+
+
+def downgrade():
+    with op.batch_alter_table('favicons', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_favicons_host'))
+
+    op.drop_table('favicons')
@@ -0,0 +1,31 @@
+"""Added vault_snapshots table
+
+Revision ID: f5ba1fa4aa70
+Revises: ee174d8e7535
+Create Date: 2026-10-18 13:48:19.026754
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'f5ba1fa4aa70'
+down_revision = 'ee174d8e7535'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('vault_snapshots',
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.Column('change_seq', sa.Integer(), nullable=False),
+    sa.Column('data', sa.LargeBinary(), nullable=False),
+    sa.Column('updated_at', sa.DateTime(timezone=True), nullable=False),
+    sa.ForeignKeyConstraint(['user_id'], ['users.id'], ),
+    sa.PrimaryKeyConstraint('user_id')
+    )
+
+
+def downgrade():
+    op.drop_table('vault_snapshots')
@@ -19,3 +19,7 @@ sess = Session()
 from .user import User
 from .password import PasswordEntry
 from .user_session import UserSession
+from .password_tombstone import PasswordTombstone
+from .favicon import Favicon
+from .vault_snapshot import VaultSnapshot
+from .entry_search_token import EntrySearchToken
@@ -0,0 +1,28 @@
+#!/usr/bin/python3
+from backend.models import db
+from sqlalchemy import Column, Integer, String, ForeignKey, Index
+from sqlalchemy.orm import relationship
+
+
+class EntrySearchToken(db.Model):
+    """
+    A blind index token of a password entry: a keyed hash computed by the
+    client (e.g. of a name trigram or of the url's host), so entries can
+    be searched without the server seeing what they hold
+    """
+    __tablename__ = "entry_search_tokens"
+    __table_args__ = (
+        # Search lookups, see /passwords/search
+        Index("ix_entry_search_tokens_user_token",
+              "user_id", "token", "entry_id"),
+    )
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    entry_id = Column(Integer,
+                      ForeignKey("password_entries.id", ondelete="CASCADE"),
+                      nullable=False, index=True)
+    token = Column(String(64), nullable=False)
+
+    # Relationship
+    user = relationship("User", back_populates="search_tokens")
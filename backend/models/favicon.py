@@ -0,0 +1,16 @@
+#!/usr/bin/python3
+from backend.models import db
+from sqlalchemy import Column, Integer, String, DateTime
+
+
+class Favicon(db.Model):
+    """
+    The favicon last resolved for a host, shared by all users.
+    content_hash is None when the host has no usable icon.
+    """
+    __tablename__ = "favicons"
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    host = Column(String(255), nullable=False, unique=True, index=True)
+    content_hash = Column(String(64), nullable=True)
+    resolved_at = Column(DateTime(timezone=True), nullable=False)
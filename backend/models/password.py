@@ -1,12 +1,24 @@
 #!/usr/bin/python3
 from backend.models import db
-from sqlalchemy import Column, Integer, String, Boolean, DateTime, ForeignKey
+from sqlalchemy import Column, Integer, String, Boolean, DateTime, ForeignKey, Index
 from sqlalchemy.sql import func
 from sqlalchemy.orm import relationship
 
 
 class PasswordEntry(db.Model):
     __tablename__ = "password_entries"
+    __table_args__ = (
+        # Keyset pagination indexes for the active list and the trash
+        Index("ix_password_entries_user_trash_id", "user_id", "in_trash", "id"),
+        Index("ix_password_entries_user_trash_moved_at",
+              "user_id", "in_trash", "moved_at"),
+        # Delta sync index, see /passwords/changes
+        Index("ix_password_entries_user_change_seq", "user_id", "change_seq"),
+        # Trash retention scans across users, see backend.utils.retention
+        Index("ix_password_entries_trash_moved_at", "in_trash", "moved_at"),
+        # Password reuse detection, see /passwords/health
+        Index("ix_password_entries_user_fingerprint", "user_id", "fingerprint"),
+    )
 
     id = Column(Integer, primary_key=True, autoincrement=True)
     user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
@@ -20,6 +32,11 @@ class PasswordEntry(db.Model):
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     updated_at = Column(DateTime(timezone=True), onupdate=func.now())
     moved_at = Column(DateTime(timezone=True), nullable=True)
+    # Keyed hash of the password computed by the client, equal for equal
+    # passwords of the same user
+    fingerprint = Column(String(64), nullable=True)
+    # Value of the owner's change sequence when this entry was last written
+    change_seq = Column(Integer, nullable=False, default=0, server_default="0")
 
     # Relationship
     user = relationship("User", back_populates="password_entries")
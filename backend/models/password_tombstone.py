@@ -0,0 +1,22 @@
+#!/usr/bin/python3
+from backend.models import db
+from sqlalchemy import Column, Integer, DateTime, ForeignKey, Index
+from sqlalchemy.sql import func
+from sqlalchemy.orm import relationship
+
+
+class PasswordTombstone(db.Model):
+    """Records a permanently deleted password entry for delta sync clients"""
+    __tablename__ = "password_tombstones"
+    __table_args__ = (
+        Index("ix_password_tombstones_user_seq", "user_id", "change_seq"),
+    )
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    entry_id = Column(Integer, nullable=False)
+    change_seq = Column(Integer, nullable=False)
+    deleted_at = Column(DateTime(timezone=True), server_default=func.now())
+
+    # Relationship
+    user = relationship("User", back_populates="tombstones")
@@ -1,6 +1,6 @@
 #!/usr/bin/python3
 from backend.models import db
-from sqlalchemy import Column, Integer, String, DateTime
+from sqlalchemy import BigInteger, Column, Integer, String, DateTime
 from sqlalchemy.sql import func
 from sqlalchemy.orm import relationship
 
@@ -15,6 +15,14 @@ class User(db.Model):
     ek_salt = Column(String(255), nullable=False)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     updated_at = Column(DateTime(timezone=True), onupdate=func.now())
+    # Vault generation, bumped by every write to the user's vault or
+    # account data, see backend.utils.vault
+    change_seq = Column(Integer, nullable=False, default=0, server_default="0")
+    # Entry counters kept up to date by every write, see backend.utils.vault
+    active_count = Column(Integer, nullable=False, default=0, server_default="0")
+    trash_count = Column(Integer, nullable=False, default=0, server_default="0")
+    entry_bytes = Column(BigInteger, nullable=False, default=0,
+                         server_default="0")
 
     # One to many relationship
     # back_populates connects the two models to allow access in both directions
@@ -26,3 +34,13 @@ class User(db.Model):
     password_entries = relationship(
         "PasswordEntry", back_populates="user", cascade="all, delete-orphan"
     )
+    tombstones = relationship(
+        "PasswordTombstone", back_populates="user", cascade="all, delete-orphan"
+    )
+    search_tokens = relationship(
+        "EntrySearchToken", back_populates="user", cascade="all, delete-orphan"
+    )
+    snapshot = relationship(
+        "VaultSnapshot", back_populates="user", uselist=False,
+        cascade="all, delete-orphan"
+    )
@@ -1,16 +1,21 @@
 #!/usr/bin/python3
 from backend.models import db
-from sqlalchemy import Column, Integer, String, DateTime, ForeignKey
+from sqlalchemy import (Column, Integer, String, DateTime, ForeignKey,
+                        LargeBinary)
 from sqlalchemy.sql import func
 from sqlalchemy.orm import relationship
 
 
 class UserSession(db.Model):
+    """Server-side session data, see backend.utils.sessions"""
     __tablename__ = "user_sessions"
 
     id = Column(Integer, primary_key=True, autoincrement=True)
-    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
-    session_id = Column(String(255), nullable=False)
+    # Empty until the session logs in
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=True)
+    session_id = Column(String(255), nullable=False, unique=True, index=True)
+    data = Column(LargeBinary, nullable=True)
+    expiry = Column(DateTime(timezone=True), nullable=True, index=True)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
 
     # Relationship
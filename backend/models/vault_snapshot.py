@@ -0,0 +1,20 @@
+#!/usr/bin/python3
+from backend.models import db
+from sqlalchemy import Column, Integer, DateTime, ForeignKey, LargeBinary
+from sqlalchemy.orm import relationship
+
+
+class VaultSnapshot(db.Model):
+    """
+    A user's whole vault as one JSON array of (client-encrypted) entries,
+    as of the vault generation change_seq, see backend.utils.snapshots
+    """
+    __tablename__ = "vault_snapshots"
+
+    user_id = Column(Integer, ForeignKey("users.id"), primary_key=True)
+    change_seq = Column(Integer, nullable=False)
+    data = Column(LargeBinary, nullable=False)
+    updated_at = Column(DateTime(timezone=True), nullable=False)
+
+    # Relationship
+    user = relationship("User", back_populates="snapshot")
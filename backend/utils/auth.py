@@ -1,6 +1,7 @@
 #!/usr/bin/python3
 from backend.models.user import User
-from backend.models import db, bcrypt
+from backend.models import db
+from backend.utils.hashing import HashingBusy, hasher
 from sqlalchemy.orm.exc import NoResultFound
 
 
@@ -23,8 +24,8 @@ class Auth:
             if user:
                 raise ValueError(f"User {username} already exists")
 
-            # Hash the password using Flask-Bcrypt
-            hashed_password = bcrypt.generate_password_hash(password).decode('utf-8')
+            # Hash the password in the bcrypt process pool
+            hashed_password = hasher.generate(password)
 
             # Create a new user with the hashed password
             new_user = User(
@@ -50,9 +51,14 @@ class Auth:
                 return False
 
             # Verify the provided password against the hashed password
-            if bcrypt.check_password_hash(user.hashed_master_password, password):
-                return user
+            # The hash is never rewritten here: clients derive the vault
+            # key from it (see PasswordHasher.needs_rehash)
+            if not hasher.check(user.hashed_master_password, password):
+                return False
 
-            return False
+            return user
+        except HashingBusy:
+            raise
         except Exception:
+            db.session.rollback()
             return False
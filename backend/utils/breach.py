@@ -0,0 +1,256 @@
+#!/usr/bin/python3
+"""
+Offline breached-password lookups against a locally provisioned
+Pwned Passwords (SHA-1) dataset.
+
+`flask breach-build` compacts the text dump ("HASH:COUNT" lines) into a
+binary file: a short header, then one fixed-width record per hash (the
+20-byte SHA-1 followed by its count as a big-endian uint32), sorted by
+hash. The file at BREACH_DATA_PATH is memory-mapped and searched by
+bisection, so a range lookup reads a few pages and needs no network.
+
+Lookups follow the k-anonymity range model: clients send the first five
+hex digits of a SHA-1 and get back every suffix under that prefix, so the
+server never learns which password is being checked.
+
+The file is opened on first use; a rebuilt file is picked up on restart.
+"""
+import heapq
+import mmap
+import os
+import re
+import struct
+import tempfile
+import threading
+import click
+from flask import current_app
+from flask.cli import with_appcontext
+
+MAGIC = b'PKBREACH'
+VERSION = 1
+HEADER = struct.Struct('>8sII')
+RECORD = struct.Struct('>20sI')
+HASH_SIZE = 20
+# Used with fullmatch: a $ would also let a trailing newline through
+PREFIX_PATTERN = re.compile(r'[0-9A-Fa-f]{5}')
+LINE_PATTERN = re.compile(rb'^([0-9A-Fa-f]{40}):(\d+)\s*$')
+# Counts past a uint32 are clamped
+MAX_COUNT = 2 ** 32 - 1
+
+
+class BreachDataUnavailable(RuntimeError):
+    """Raised when no breach data file is provisioned or it is unreadable."""
+
+
+def prefix_bounds(prefix):
+    """
+    The first hash under a 5 hex digit prefix and the first hash past it,
+    the latter None for the last prefix.
+    """
+    value = int(prefix, 16)
+    start = (value << 140).to_bytes(HASH_SIZE, 'big')
+    if value == 0xFFFFF:
+        return start, None
+    return start, ((value + 1) << 140).to_bytes(HASH_SIZE, 'big')
+
+
+class BreachIndex:
+    """Range lookups in a memory-mapped breach data file."""
+
+    def __init__(self, path):
+        self.path = path
+        with open(path, 'rb') as data_file:
+            self.map = mmap.mmap(data_file.fileno(), 0, access=mmap.ACCESS_READ)
+        if len(self.map) < HEADER.size:
+            raise BreachDataUnavailable("Breach data file is truncated")
+        magic, version, record_size = HEADER.unpack_from(self.map)
+        if magic != MAGIC or version != VERSION or record_size != RECORD.size:
+            raise BreachDataUnavailable("Not a breach data file")
+        size = len(self.map) - HEADER.size
+        if size % RECORD.size:
+            raise BreachDataUnavailable("Breach data file is truncated")
+        self.count = size // RECORD.size
+
+    def hash_at(self, i):
+        offset = HEADER.size + i * RECORD.size
+        return self.map[offset:offset + HASH_SIZE]
+
+    def lower_bound(self, key):
+        """Index of the first record whose hash is >= key."""
+        low, high = 0, self.count
+        while low < high:
+            middle = (low + high) // 2
+            if self.hash_at(middle) < key:
+                low = middle + 1
+            else:
+                high = middle
+        return low
+
+    def range(self, prefix):
+        """
+        Returns [(suffix, count)] of every hash starting with the 5 hex
+        digit prefix, the suffixes being the other 35 digits in upper case.
+        """
+        start_key, end_key = prefix_bounds(prefix)
+        start = self.lower_bound(start_key)
+        end = self.lower_bound(end_key) if end_key else self.count
+
+        results = []
+        for i in range(start, end):
+            digest, count = RECORD.unpack_from(
+                self.map, HEADER.size + i * RECORD.size)
+            results.append((digest.hex().upper()[5:], count))
+        return results
+
+
+class BreachService:
+    """Holds the breach index of the app, opening it on first use."""
+
+    def init_app(self, app):
+        self.path = app.config['BREACH_DATA_PATH']
+        self.index = None
+        self.lock = threading.Lock()
+        app.extensions['breach'] = self
+        app.cli.add_command(build_command)
+
+    def get_index(self):
+        if self.index is None:
+            if not self.path or not os.path.exists(self.path):
+                raise BreachDataUnavailable("Breach data is not provisioned")
+            with self.lock:
+                if self.index is None:
+                    try:
+                        self.index = BreachIndex(self.path)
+                    except (OSError, ValueError) as e:
+                        raise BreachDataUnavailable(str(e))
+        return self.index
+
+    def range(self, prefix):
+        return self.get_index().range(prefix)
+
+
+breach = BreachService()
+
+
+class DumpReader:
+    """
+    Iterates over the (digest, count) records of "HASH:COUNT" lines,
+    counting the non-blank lines skipped for not being in that format.
+    """
+
+    def __init__(self, lines):
+        self.lines = lines
+        self.skipped = 0
+
+    def __iter__(self):
+        for line in self.lines:
+            match = LINE_PATTERN.match(line)
+            if match is None:
+                if line.strip():
+                    self.skipped += 1
+                continue
+            yield (bytes.fromhex(match.group(1).decode('ascii')),
+                   min(int(match.group(2)), MAX_COUNT))
+
+
+def sorted_runs(records, run_size, directory):
+    """
+    Sorts records run_size at a time into temporary files, and returns
+    their paths, for datasets that do not fit in memory at once.
+    """
+    paths = []
+    run = []
+
+    def write_run():
+        run.sort()
+        fd, path = tempfile.mkstemp(dir=directory, suffix='.run')
+        paths.append(path)
+        with os.fdopen(fd, 'wb') as run_file:
+            run_file.write(b''.join(RECORD.pack(*record) for record in run))
+        run.clear()
+
+    try:
+        for record in records:
+            run.append(record)
+            if len(run) == run_size:
+                write_run()
+        if run or not paths:
+            write_run()
+    except BaseException:
+        # The runs written so far are of no use without the rest
+        remove_files(paths)
+        raise
+    return paths
+
+
+def remove_files(paths):
+    for path in paths:
+        try:
+            os.unlink(path)
+        except FileNotFoundError:
+            pass
+
+
+def iter_run(path):
+    with open(path, 'rb') as run_file:
+        while True:
+            data = run_file.read(RECORD.size * 4096)
+            if not data:
+                return
+            yield from RECORD.iter_unpack(data)
+
+
+def build_breach_file(source, output, run_size=5_000_000):
+    """
+    Builds a breach data file at output from a text dump. Duplicate hashes
+    have their counts added up. Returns (records written, lines skipped).
+    """
+    directory = os.path.dirname(os.path.abspath(output))
+    with open(source, 'rb') as lines:
+        reader = DumpReader(lines)
+        runs = sorted_runs(reader, run_size, directory)
+
+    written = 0
+    try:
+        fd, temp_path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as out:
+                out.write(HEADER.pack(MAGIC, VERSION, RECORD.size))
+                previous, total = None, 0
+                for digest, count in heapq.merge(
+                        *[iter_run(path) for path in runs]):
+                    if digest == previous:
+                        total = min(total + count, MAX_COUNT)
+                        continue
+                    if previous is not None:
+                        out.write(RECORD.pack(previous, total))
+                        written += 1
+                    previous, total = digest, count
+                if previous is not None:
+                    out.write(RECORD.pack(previous, total))
+                    written += 1
+            # Readers never see a half-written file
+            os.replace(temp_path, output)
+        except BaseException:
+            os.unlink(temp_path)
+            raise
+    finally:
+        remove_files(runs)
+    return written, reader.skipped
+
+
+@click.command('breach-build')
+@click.argument('source', type=click.Path(exists=True, dir_okay=False))
+@click.option('--output', default=None,
+              help='File to write [default: BREACH_DATA_PATH].')
+@click.option('--run-size', default=5_000_000, show_default=True,
+              help='Records sorted in memory at once.')
+@with_appcontext
+def build_command(source, output, run_size):
+    """Builds the breach data file from a Pwned Passwords SHA-1 dump."""
+    output = output or current_app.config['BREACH_DATA_PATH']
+    if not output:
+        raise click.UsageError("Set BREACH_DATA_PATH or pass --output.")
+    written, skipped = build_breach_file(source, output, run_size)
+    click.echo(f"Wrote {written} hashes to {output}"
+               + (f" ({skipped} malformed lines skipped)" if skipped else ""))
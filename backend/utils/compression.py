@@ -0,0 +1,154 @@
+#!/usr/bin/python3
+"""
+Content-negotiated response compression (COMPRESS_ENABLED = True).
+
+gzip, brotli ("br") and zstd are offered (`brotli` and `zstandard` are
+in requirements.txt; without them only gzip is). Buffered responses
+smaller than COMPRESS_MIN_SIZE are sent as they are. Streamed responses
+(e.g. /export) are compressed chunk by chunk, each chunk flushed as it
+is produced, so they stay streamed.
+"""
+import zlib
+from flask import request
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+
+class GzipCompressor:
+    """gzip over zlib, with the compress/flush/finish interface below."""
+
+    def __init__(self, level):
+        # wbits 31: a gzip header and trailer around the deflate stream
+        self.compressor = zlib.compressobj(level, zlib.DEFLATED, 31)
+
+    def compress(self, data):
+        return self.compressor.compress(data)
+
+    def flush(self):
+        """Returns everything compressed so far, the stream continuing."""
+        return self.compressor.flush(zlib.Z_SYNC_FLUSH)
+
+    def finish(self):
+        return self.compressor.flush(zlib.Z_FINISH)
+
+
+class BrotliCompressor:
+
+    def __init__(self, level):
+        self.compressor = brotli.Compressor(quality=level)
+
+    def compress(self, data):
+        return self.compressor.process(data)
+
+    def flush(self):
+        return self.compressor.flush()
+
+    def finish(self):
+        return self.compressor.finish()
+
+
+class ZstdCompressor:
+
+    def __init__(self, level):
+        self.compressor = zstandard.ZstdCompressor(level=level).compressobj()
+
+    def compress(self, data):
+        return self.compressor.compress(data)
+
+    def flush(self):
+        return self.compressor.flush(zstandard.COMPRESSOBJ_FLUSH_BLOCK)
+
+    def finish(self):
+        return self.compressor.flush(zstandard.COMPRESSOBJ_FLUSH_FINISH)
+
+
+# Content-Encoding -> (compressor class, level setting), for the
+# encodings whose library is installed
+COMPRESSORS = {'gzip': (GzipCompressor, 'COMPRESS_GZIP_LEVEL')}
+if brotli is not None:
+    COMPRESSORS['br'] = (BrotliCompressor, 'COMPRESS_BR_LEVEL')
+if zstandard is not None:
+    COMPRESSORS['zstd'] = (ZstdCompressor, 'COMPRESS_ZSTD_LEVEL')
+
+
+def compress_chunks(chunks, compressor):
+    """
+    Compresses a response body (an iterable of str or bytes), yielding
+    output as each chunk ends.
+    """
+    try:
+        for chunk in chunks:
+            if isinstance(chunk, str):
+                chunk = chunk.encode('utf-8')
+            data = compressor.compress(chunk) + compressor.flush()
+            if data:
+                yield data
+        yield compressor.finish()
+    finally:
+        # Closes the wrapped body, e.g. a stream_with_context generator
+        if hasattr(chunks, 'close'):
+            chunks.close()
+
+
+def init_compression(app):
+    """Compresses responses the client accepts compressed, when enabled."""
+    if not app.config['COMPRESS_ENABLED']:
+        return
+
+    # Server preference, used when the client weighs encodings equally
+    encodings = [
+        encoding.strip()
+        for encoding in app.config['COMPRESS_ALGORITHMS'].split(',')
+        if encoding.strip() in COMPRESSORS
+    ]
+    mimetypes = {
+        mimetype.strip()
+        for mimetype in app.config['COMPRESS_MIMETYPES'].split(',')
+    }
+    min_size = app.config['COMPRESS_MIN_SIZE']
+
+    @app.after_request
+    def compress_response(response):
+        if (response.status_code < 200
+                or response.status_code in (204, 206, 304)
+                or request.method == 'HEAD'
+                or response.direct_passthrough
+                or response.mimetype not in mimetypes
+                or 'Content-Encoding' in response.headers
+                or 'no-transform' in response.headers.get('Cache-Control', '')):
+            return response
+
+        # The body depends on Accept-Encoding from here on, even when it
+        # ends up sent as it is
+        response.vary.add('Accept-Encoding')
+
+        encoding = request.accept_encodings.best_match(encodings)
+        if encoding is None:
+            return response
+        compressor_class, level_setting = COMPRESSORS[encoding]
+        compressor = compressor_class(app.config[level_setting])
+
+        if response.is_streamed:
+            response.response = compress_chunks(response.response, compressor)
+            response.headers.pop('Content-Length', None)
+        else:
+            data = response.get_data()
+            if len(data) < min_size:
+                return response
+            response.set_data(compressor.compress(data) + compressor.finish())
+
+        response.headers['Content-Encoding'] = encoding
+
+        # The compressed bytes differ from the ones the strong ETag names
+        etag, weak = response.get_etag()
+        if etag and not weak:
+            response.set_etag(etag, weak=True)
+        return response
@@ -0,0 +1,75 @@
+#!/usr/bin/python3
+"""
+Streaming export of a user's vault.
+
+Rows are read in batches through a server-side cursor, selecting plain
+columns rather than ORM objects, and written out chunk by chunk, so memory
+use does not grow with the size of the vault.
+"""
+import csv
+from io import StringIO
+from backend.models import db
+from backend.models.password import PasswordEntry
+from backend.utils.serializers import dumps, entry_columns, entry_dicts
+from flask import current_app
+from sqlalchemy import select
+
+# Exported fields, in CSV column order
+EXPORT_FIELDS = ['name', 'username', 'password', 'url', 'favicon_url',
+                 'notes', 'created_at', 'updated_at']
+
+EXPORT_MIMETYPES = {
+    'json': 'application/json',
+    'ndjson': 'application/x-ndjson',
+    'csv': 'text/csv',
+}
+
+
+def export_batches(user_id, batch_size):
+    """Yields lists of row tuples of a user's entries, in id order."""
+    stmt = (
+        select(*entry_columns(EXPORT_FIELDS))
+        .where(PasswordEntry.user_id == user_id)
+        .order_by(PasswordEntry.id)
+        .execution_options(yield_per=batch_size)
+    )
+    result = db.session.execute(stmt)
+    try:
+        for batch in result.partitions():
+            yield batch
+    finally:
+        result.close()
+
+
+def export_chunks(user_id, file_type, batch_size=None):
+    """Yields the export of a user's entries as str chunks, one per batch."""
+    if batch_size is None:
+        batch_size = current_app.config['EXPORT_BATCH_SIZE']
+    batches = export_batches(user_id, batch_size)
+
+    if file_type == 'csv':
+        output = StringIO()
+        writer = csv.writer(output)
+        writer.writerow(EXPORT_FIELDS)
+        for batch in batches:
+            writer.writerows(batch)
+            yield output.getvalue()
+            output.seek(0)
+            output.truncate()
+        yield output.getvalue()
+        return
+
+    if file_type == 'ndjson':
+        for batch in batches:
+            yield ''.join(
+                dumps(entry) + '\n'
+                for entry in entry_dicts(batch, EXPORT_FIELDS)
+            )
+        return
+
+    # json: a single array, written one batch of elements at a time
+    separator = '['
+    for batch in batches:
+        yield separator + dumps(entry_dicts(batch, EXPORT_FIELDS))[1:-1]
+        separator = ','
+    yield '[]' if separator == '[' else ']'
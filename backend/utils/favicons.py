@@ -0,0 +1,257 @@
+#!/usr/bin/python3
+"""
+Server-side favicon resolution.
+
+Icons are fetched once per host, through a pluggable fetcher, and kept on
+disk under FAVICON_DIR named by the SHA-256 of their bytes, so hosts that
+share an icon share one file. The host -> hash mapping lives in the
+favicons table; recently served icons are also kept in memory.
+
+FAVICON_FETCHER may name another FaviconFetcher class (for example one
+that talks to a local stand-in server in tests); the default one gets
+FAVICON_UPSTREAM with {host} filled in.
+
+Hosts are resolved for whoever asks and are not linked to users.
+"""
+import hashlib
+import os
+import re
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from urllib.parse import urlsplit
+import requests
+from backend.models import db
+from backend.models.favicon import Favicon
+from backend.utils.sessions import TTLCache, as_utc, utcnow
+from sqlalchemy.exc import IntegrityError
+from werkzeug.utils import import_string
+
+# \Z rather than $, which would also let a trailing newline through
+HASH_PATTERN = re.compile(r'^[0-9a-f]{64}\Z')
+HOST_PATTERN = re.compile(
+    r'^(?=.{1,253}\Z)([a-z0-9]([a-z0-9-]{0,61}[a-z0-9])?)'
+    r'(\.[a-z0-9]([a-z0-9-]{0,61}[a-z0-9])?)*(:\d{1,5})?\Z'
+)
+
+# Leading bytes of the image formats served, with their mimetypes
+IMAGE_SIGNATURES = [
+    (b'\x00\x00\x01\x00', 'image/x-icon'),
+    (b'\x89PNG\r\n\x1a\n', 'image/png'),
+    (b'GIF87a', 'image/gif'),
+    (b'GIF89a', 'image/gif'),
+    (b'\xff\xd8\xff', 'image/jpeg'),
+    (b'BM', 'image/bmp'),
+]
+
+
+def image_mimetype(data):
+    """The mimetype of an icon's bytes, None when they are not an image."""
+    for signature, mimetype in IMAGE_SIGNATURES:
+        if data.startswith(signature):
+            return mimetype
+    if data[:4] == b'RIFF' and data[8:12] == b'WEBP':
+        return 'image/webp'
+    # SVG is left out: it can carry scripts
+    return None
+
+
+def normalize_host(value):
+    """
+    The host of a URL or bare host name, guessing https like the client
+    does, or None when there is no valid host in it.
+    """
+    if not isinstance(value, str):
+        return None
+    value = value.strip()
+    if '://' not in value:
+        value = 'https://' + value
+    try:
+        parts = urlsplit(value)
+        host = parts.hostname
+        port = parts.port
+    except ValueError:
+        return None
+    if not host:
+        return None
+    try:
+        host = host.encode('idna').decode('ascii')
+    except UnicodeError:
+        return None
+    if port and port not in (80, 443):
+        host = f'{host}:{port}'
+    return host if HOST_PATTERN.match(host) else None
+
+
+class FaviconFetcher:
+    """Interface of the fetchers that get a host's icon upstream."""
+
+    def __init__(self, app):
+        self.app = app
+
+    def fetch(self, host):
+        """Returns the icon bytes of `host`, or None when it has none."""
+        raise NotImplementedError
+
+
+class HTTPFaviconFetcher(FaviconFetcher):
+    """Gets icons over HTTP from the FAVICON_UPSTREAM URL template."""
+
+    def __init__(self, app):
+        super().__init__(app)
+        self.upstream = app.config['FAVICON_UPSTREAM']
+        self.timeout = app.config['FAVICON_TIMEOUT']
+        self.max_bytes = app.config['FAVICON_MAX_BYTES']
+        self.http = requests.Session()
+
+    def fetch(self, host):
+        url = self.upstream.format(host=host)
+        with self.http.get(url, timeout=self.timeout, stream=True) as response:
+            if response.status_code != 200:
+                return None
+            data = b''
+            for chunk in response.iter_content(8192):
+                data += chunk
+                if len(data) > self.max_bytes:
+                    return None
+        return data
+
+
+class FaviconService:
+    """Resolves hosts to stored icons and serves them by hash."""
+
+    def init_app(self, app):
+        fetcher_class = app.config.get('FAVICON_FETCHER') or HTTPFaviconFetcher
+        if isinstance(fetcher_class, str):
+            fetcher_class = import_string(fetcher_class)
+        self.fetcher = fetcher_class(app)
+        self.directory = app.config['FAVICON_DIR']
+        os.makedirs(self.directory, exist_ok=True)
+        self.ttl = timedelta(seconds=app.config['FAVICON_TTL'])
+        self.negative_ttl = timedelta(seconds=app.config['FAVICON_NEGATIVE_TTL'])
+        # Icons never change under a hash, so they only leave by LRU
+        self.cache = TTLCache(app.config['FAVICON_CACHE_SIZE'], float('inf'))
+        self.executor = ThreadPoolExecutor(
+            max_workers=app.config['FAVICON_MAX_WORKERS'],
+            thread_name_prefix='favicons'
+        )
+        # host -> Future of the fetch in progress, shared by all requests
+        self._pending = {}
+        self._lock = threading.Lock()
+        app.extensions['favicons'] = self
+
+    def path(self, content_hash):
+        return os.path.join(self.directory, content_hash[:2], content_hash)
+
+    def load(self, content_hash):
+        """Returns (bytes, mimetype) of a stored icon, or None."""
+        if not HASH_PATTERN.match(content_hash):
+            return None
+        icon = self.cache.get(content_hash)
+        if icon is not None:
+            return icon
+        try:
+            with open(self.path(content_hash), 'rb') as icon_file:
+                data = icon_file.read()
+        except FileNotFoundError:
+            return None
+        icon = (data, image_mimetype(data))
+        self.cache.set(content_hash, icon)
+        return icon
+
+    def store(self, data):
+        """Writes an icon under its hash, once, and returns the hash."""
+        content_hash = hashlib.sha256(data).hexdigest()
+        path = self.path(content_hash)
+        if not os.path.exists(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            fd, temp_path = tempfile.mkstemp(dir=self.directory)
+            with os.fdopen(fd, 'wb') as temp_file:
+                temp_file.write(data)
+            # Atomic, so readers never see part of a file
+            os.replace(temp_path, path)
+        self.cache.set(content_hash, (data, image_mimetype(data)))
+        return content_hash
+
+    def _fetch(self, host):
+        """Fetches and stores the icon of a host, returning its hash."""
+        try:
+            data = self.fetcher.fetch(host)
+        except requests.RequestException:
+            data = None
+        if not data or image_mimetype(data) is None:
+            return None
+        return self.store(data)
+
+    def _fetch_shared(self, host):
+        """A Future of the hash of host's icon, joining a fetch under way."""
+        with self._lock:
+            future = self._pending.get(host)
+            if future is not None:
+                return future
+            future = self.executor.submit(self._fetch, host)
+            self._pending[host] = future
+        # Outside the lock: the callback runs right here, and takes the
+        # lock, when the fetch has already finished
+        future.add_done_callback(lambda _, host=host: self._release(host))
+        return future
+
+    def _release(self, host):
+        with self._lock:
+            self._pending.pop(host, None)
+
+    def resolve(self, hosts):
+        """
+        Returns {host: content hash or None} for normalized hosts. Hosts
+        not resolved lately are fetched concurrently and recorded.
+        """
+        now = utcnow()
+        known = {
+            favicon.host: favicon
+            for favicon in Favicon.query.filter(Favicon.host.in_(hosts))
+        }
+
+        resolved = {}
+        stale = []
+        for host in hosts:
+            favicon = known.get(host)
+            if favicon is not None:
+                ttl = self.ttl if favicon.content_hash else self.negative_ttl
+                if as_utc(favicon.resolved_at) + ttl > now:
+                    resolved[host] = favicon.content_hash
+                    continue
+            stale.append(host)
+
+        futures = {host: self._fetch_shared(host) for host in stale}
+        for host, future in futures.items():
+            resolved[host] = future.result()
+
+        if stale:
+            self._record({host: resolved[host] for host in stale}, known, now)
+        return resolved
+
+    def _record(self, hashes, known, now):
+        """Saves host -> hash mappings, racing other writers safely."""
+        for attempt in range(2):
+            for host, content_hash in hashes.items():
+                favicon = known.get(host)
+                if favicon is None:
+                    favicon = Favicon(host=host)
+                    db.session.add(favicon)
+                favicon.content_hash = content_hash
+                favicon.resolved_at = now
+            try:
+                db.session.commit()
+                return
+            except IntegrityError:
+                # Another request recorded one of the hosts first
+                db.session.rollback()
+                known = {
+                    favicon.host: favicon
+                    for favicon in Favicon.query.filter(
+                        Favicon.host.in_(list(hashes)))
+                }
+
+
+favicons = FaviconService()
@@ -0,0 +1,144 @@
+#!/usr/bin/python3
+"""
+Master password hashing off the request threads.
+
+bcrypt is CPU bound and holds a core for the whole hash, so hashes are
+computed in a small dedicated process pool. Callers wait for a free slot
+for at most BCRYPT_QUEUE_TIMEOUT seconds (HashingBusy is raised after
+that), which keeps a login storm from queueing up every web worker.
+
+The hash functions below run in the pool's processes and only need the
+bcrypt module.
+"""
+import multiprocessing
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+import bcrypt
+import click
+from backend.utils.metrics import BCRYPT_SECONDS
+
+# Prefix of the hashes made here, as with Flask-Bcrypt's default
+HASH_PREFIX = b'2b'
+
+
+class HashingBusy(RuntimeError):
+    """Raised when no hashing slot frees up within the queue timeout."""
+
+
+def hash_password(password, rounds):
+    """Hashes a password with the given bcrypt cost."""
+    salt = bcrypt.gensalt(rounds=rounds, prefix=HASH_PREFIX)
+    return bcrypt.hashpw(password.encode('utf-8'), salt).decode('utf-8')
+
+
+def check_password(hashed, password):
+    """Checks a password against a bcrypt hash."""
+    return bcrypt.checkpw(password.encode('utf-8'), hashed.encode('utf-8'))
+
+
+def hash_cost(hashed):
+    """Returns the cost factor of a bcrypt hash, like $2b$12$..."""
+    try:
+        return int(hashed.split('$')[2])
+    except (IndexError, ValueError):
+        return None
+
+
+def calibrate_rounds(target_ms, min_rounds=4, max_rounds=20):
+    """
+    Times bcrypt on this machine and returns (rounds, ms): the highest cost
+    whose hash takes at most target_ms (min_rounds when none does), and
+    how long one hash took at that cost.
+    """
+    best = None
+    for rounds in range(min_rounds, max_rounds + 1):
+        start = time.perf_counter()
+        hash_password('calibration', rounds)
+        elapsed = (time.perf_counter() - start) * 1000
+        if best is not None and elapsed > target_ms:
+            break
+        best = (rounds, elapsed)
+        # Every extra round doubles the work
+        if elapsed * 2 > target_ms:
+            break
+    return best
+
+
+class PasswordHasher:
+    """Hashes and checks master passwords on a bounded process pool."""
+
+    def __init__(self, app=None):
+        self._executor = None
+        self.rounds = 12
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        config = app.config
+        self.rounds = config['BCRYPT_LOG_ROUNDS']
+        self.queue_timeout = config['BCRYPT_QUEUE_TIMEOUT']
+
+        pool_size = config['BCRYPT_POOL_SIZE']
+        if pool_size > 0:
+            # spawn, as forking a multi-threaded web worker is not safe
+            self._executor = ProcessPoolExecutor(
+                max_workers=pool_size,
+                mp_context=multiprocessing.get_context('spawn')
+            )
+        # Hashes running plus hashes waiting for a process
+        self._slots = threading.BoundedSemaphore(
+            max(pool_size, 1) + config['BCRYPT_MAX_PENDING'])
+
+        app.extensions['password_hasher'] = self
+        app.cli.add_command(calibrate_command)
+
+    def _run(self, operation, func, *args):
+        start = time.perf_counter()
+        if not self._slots.acquire(timeout=self.queue_timeout):
+            raise HashingBusy("Too many login attempts in progress")
+        try:
+            if self._executor is None:
+                return func(*args)
+            return self._executor.submit(func, *args).result()
+        finally:
+            self._slots.release()
+            BCRYPT_SECONDS.observe(time.perf_counter() - start, operation)
+
+    def generate(self, password):
+        """Returns a bcrypt hash of password at the configured cost."""
+        return self._run('hash', hash_password, password, self.rounds)
+
+    def check(self, hashed, password):
+        """Whether password matches the bcrypt hash."""
+        return self._run('check', check_password, hashed, password)
+
+    def needs_rehash(self, hashed):
+        """
+        Whether a hash was made with a lower cost than the configured one.
+
+        Only for reporting: a stored hash must not be replaced while the
+        client derives its vault key from hashed_master_password (served
+        by /internal/get-ek-salt), as every entry would stop decrypting.
+        A new cost applies to new accounts only.
+        """
+        cost = hash_cost(hashed)
+        return cost is None or cost < self.rounds
+
+
+hasher = PasswordHasher()
+
+
+@click.command('bcrypt-calibrate')
+@click.option('--target-ms', default=250.0, show_default=True,
+              help='Longest acceptable time for one hash, in milliseconds.')
+def calibrate_command(target_ms):
+    """
+    Finds the bcrypt cost that fits a target hashing time. The cost only
+    applies to new accounts: existing hashes are never rehashed, as
+    clients derive their vault keys from them.
+    """
+    rounds, elapsed = calibrate_rounds(target_ms)
+    click.echo(f"BCRYPT_LOG_ROUNDS={rounds}  ({elapsed:.0f} ms per hash)")
+    click.echo("Applies to new accounts only; existing hashes keep their "
+               "cost, as vault keys are derived from them.")
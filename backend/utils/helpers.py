@@ -7,10 +7,16 @@ from flask import request, session, jsonify
 def check_session():
     """Check if user is logged in before accessing certain routes."""
     # List public routes that don't require authentication
-    public_routes = ["/", "/login", "/signup", "/favicon.ico", "/check-auth", "/google", "/callback"]
+    public_routes = ["/", "/login", "/signup", "/favicon.ico", "/check-auth", "/google", "/callback",
+                     "/metrics"]
+
+    # Content-addressed favicons are public, like the sites' own icons
+    public_prefixes = ["/favicons/"]
 
     # Allow access to public routes or if user is logged in
-    if request.path in public_routes or "user_id" in session:
+    if (request.path in public_routes
+            or request.path.startswith(tuple(public_prefixes))
+            or "user_id" in session):
         return None
 
     # Block access if user is not authenticated
@@ -0,0 +1,264 @@
+#!/usr/bin/python3
+"""
+Bulk import of password entries.
+
+The request body (a JSON array, or one JSON object per line) is parsed
+incrementally while it is read, and entries are inserted in fixed-size
+batches with one executemany INSERT per batch. Each batch is committed on
+its own, so a bad batch does not undo the ones before it.
+"""
+import codecs
+import json
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from backend.models import db
+from backend.models.password import PasswordEntry
+from backend.utils.search import (InvalidSearchTokens, add_search_tokens,
+                                  parse_search_tokens, valid_token)
+from backend.utils.vault import adjust_counters, entry_size, next_change_seq
+from sqlalchemy import insert
+from sqlalchemy.exc import SQLAlchemyError
+
+# Fields read from each imported entry, and the ones that must be present
+IMPORT_FIELDS = ['name', 'username', 'password', 'url', 'favicon_url', 'notes',
+                 'fingerprint']
+REQUIRED_FIELDS = ['name', 'username', 'password']
+
+
+class ImportTooLarge(ValueError):
+    """Raised when an import body goes over the configured size limit."""
+
+
+class InvalidEntry(ValueError):
+    """Raised when an imported entry cannot be stored."""
+
+
+def parse_timestamp(value):
+    """Parses an ISO 8601 or HTTP date (as sent by /export) into a datetime."""
+    if value is None or value == '':
+        return None
+    if not isinstance(value, str):
+        raise InvalidEntry("Invalid date")
+    try:
+        # fromisoformat() only reads a 'Z' suffix from Python 3.11 on
+        if value.endswith('Z'):
+            value = value[:-1] + '+00:00'
+        return datetime.fromisoformat(value)
+    except ValueError:
+        pass
+    try:
+        return parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        raise InvalidEntry(f"Invalid date: {value}")
+
+
+def entry_row(entry, user_id):
+    """
+    Validates an entry sent by a client and turns it into a row for
+    insert(PasswordEntry). Every row has the same keys, as executemany
+    requires.
+    """
+    if not isinstance(entry, dict):
+        raise InvalidEntry("Entry is not an object")
+
+    row = {'user_id': user_id}
+    for field in IMPORT_FIELDS:
+        value = entry.get(field)
+        if value is not None and not isinstance(value, str):
+            raise InvalidEntry(f"Invalid {field}")
+        max_length = PasswordEntry.__table__.c[field].type.length
+        if value and len(value) > max_length:
+            raise InvalidEntry(f"{field} is longer than {max_length} characters")
+        row[field] = value
+
+    for field in REQUIRED_FIELDS:
+        if not row[field]:
+            raise InvalidEntry(f"Missing {field}")
+    if row['fingerprint'] is not None and not valid_token(row['fingerprint']):
+        raise InvalidEntry("Invalid fingerprint")
+
+    row['created_at'] = (parse_timestamp(entry.get('created_at'))
+                         or datetime.now(timezone.utc))
+    row['updated_at'] = parse_timestamp(entry.get('updated_at'))
+
+    # Not a column: taken out again by insert_batch
+    try:
+        row['search_tokens'] = parse_search_tokens(
+            entry.get('search_tokens', []))
+    except InvalidSearchTokens as e:
+        raise InvalidEntry(str(e))
+    return row
+
+
+def iter_json_entries(stream, max_bytes, chunk_size=64 * 1024):
+    """
+    Yields the values of a JSON array, or of newline-delimited JSON, read
+    from a binary stream chunk by chunk. Raises ImportTooLarge past
+    max_bytes and ValueError on malformed input.
+    """
+    decoder = json.JSONDecoder()
+    utf8 = codecs.getincrementaldecoder('utf-8')()
+    buffer = ''
+    pos = 0
+    total = 0
+    eof = False
+    # None until the first character is seen, then True for an array
+    in_array = None
+    expect_value = True
+    count = 0
+
+    def fill():
+        nonlocal buffer, pos, total, eof
+        chunk = stream.read(chunk_size)
+        total += len(chunk)
+        if total > max_bytes:
+            raise ImportTooLarge(f"Import is larger than {max_bytes} bytes")
+        if not chunk:
+            eof = True
+        buffer = buffer[pos:] + utf8.decode(chunk, final=eof)
+        pos = 0
+
+    def skip_whitespace():
+        nonlocal pos
+        while True:
+            while pos < len(buffer) and buffer[pos] in ' \t\r\n':
+                pos += 1
+            if pos < len(buffer) or eof:
+                return
+            fill()
+
+    while True:
+        skip_whitespace()
+        if pos == len(buffer):
+            if in_array:
+                raise ValueError("Unterminated JSON array")
+            return
+
+        char = buffer[pos]
+        if in_array is None:
+            in_array = char == '['
+            if in_array:
+                pos += 1
+                continue
+        if in_array:
+            # The array ends after a value, or right away when it is empty
+            if char == ']' and (not expect_value or count == 0):
+                pos += 1
+                skip_whitespace()
+                if pos != len(buffer):
+                    raise ValueError("Unexpected data after JSON array")
+                return
+            if not expect_value:
+                if char != ',':
+                    raise ValueError("Expected ',' or ']' in JSON array")
+                pos += 1
+                expect_value = True
+                continue
+
+        # Decode the next value, reading more input while it is incomplete
+        while True:
+            try:
+                value, end = decoder.raw_decode(buffer, pos)
+                # A number may continue in the next chunk
+                if end < len(buffer) or eof or buffer[pos] in '{["':
+                    break
+            except json.JSONDecodeError:
+                if eof:
+                    raise ValueError("Malformed JSON")
+            fill()
+        pos = end
+        expect_value = False
+        count += 1
+        yield value
+
+
+def insert_rows(user_id, rows, returning=False):
+    """
+    Inserts rows made by entry_row in one multi-row statement, without
+    committing. Returns the new ids in the order of the rows when
+    returning is set, else None.
+    """
+    change_seq = next_change_seq(user_id)
+    tokens = []
+    for row in rows:
+        row['change_seq'] = change_seq
+        tokens.append(row.pop('search_tokens'))
+    adjust_counters(user_id, active=len(rows),
+                    entry_bytes=sum(entry_size(row) for row in rows))
+
+    if not returning and not any(tokens):
+        db.session.execute(insert(PasswordEntry), rows)
+        return None
+
+    # The new ids, in the order of the rows, e.g. to attach the tokens to
+    ids = db.session.execute(
+        insert(PasswordEntry).returning(PasswordEntry.id,
+                                        sort_by_parameter_order=True),
+        rows
+    ).scalars().all()
+    add_search_tokens(user_id, dict(zip(ids, tokens)))
+    return ids if returning else None
+
+
+def insert_batch(user_id, rows):
+    """Inserts a batch of rows made by entry_row in one transaction."""
+    insert_rows(user_id, rows)
+    db.session.commit()
+
+
+def import_entries(user_id, entries, batch_size, on_batch=None):
+    """
+    Inserts the entries of an iterable for a user, batch_size entries at a
+    time. on_batch, when given, is called with the summary after each batch.
+
+    Returns (summary, error): the summary holds the accepted/rejected
+    counts overall and per batch; error is the exception that stopped the
+    import early when the input could not be read (the batch being built
+    is then dropped, earlier batches stay committed), or None.
+    """
+    summary = {'accepted': 0, 'rejected': 0, 'batches': []}
+    rows, errors, size = [], [], 0
+
+    def flush():
+        accepted = len(rows)
+        if rows:
+            try:
+                insert_batch(user_id, rows)
+            except SQLAlchemyError as e:
+                db.session.rollback()
+                errors.append({'index': None, 'error': "Database error: " + str(e)})
+                accepted = 0
+        summary['batches'].append({
+            'accepted': accepted,
+            'rejected': size - accepted,
+            'errors': errors,
+        })
+        summary['accepted'] += accepted
+        summary['rejected'] += size - accepted
+        if on_batch:
+            on_batch(summary)
+
+    entries = iter(entries)
+    index = 0
+    while True:
+        try:
+            entry = next(entries)
+        except StopIteration:
+            break
+        except ValueError as e:
+            return summary, e
+
+        try:
+            rows.append(entry_row(entry, user_id))
+        except InvalidEntry as e:
+            errors.append({'index': index, 'error': str(e)})
+        index += 1
+        size += 1
+
+        if size == batch_size:
+            flush()
+            rows, errors, size = [], [], 0
+
+    if size:
+        flush()
+    return summary, None
@@ -0,0 +1,108 @@
+#!/usr/bin/python3
+"""
+Opt-in per-request SQL instrumentation (SQL_INSTRUMENTATION = True).
+
+SQLAlchemy engine events count and time every statement run while a
+request is handled. After the view returns, the totals are sent in a
+Server-Timing header and written as one JSON log line on the
+"passkeyper.sql" logger, with the slowest statements and any statement
+repeated SQL_N_PLUS_ONE_THRESHOLD times or more (a likely N+1 pattern).
+
+Statements run by streamed response bodies, or while the session is
+saved, happen after the response is built and are not counted.
+"""
+import heapq
+import json
+import logging
+import time
+from collections import Counter
+from backend.models import db
+from flask import g, has_request_context, request
+from sqlalchemy import event
+
+logger = logging.getLogger('passkeyper.sql')
+
+
+class RequestSQLStats:
+    """Statements run during one request."""
+
+    def __init__(self, keep_slowest):
+        self.count = 0
+        self.total = 0.0
+        self.keep_slowest = keep_slowest
+        self.slowest = []
+        self.statements = Counter()
+
+    def add(self, statement, duration):
+        self.count += 1
+        self.total += duration
+        self.statements[statement] += 1
+        item = (duration, self.count, statement)
+        if len(self.slowest) < self.keep_slowest:
+            heapq.heappush(self.slowest, item)
+        else:
+            heapq.heappushpop(self.slowest, item)
+
+
+def init_sql_instrumentation(app):
+    """Hooks the engine events and response headers when enabled."""
+    if not app.config['SQL_INSTRUMENTATION']:
+        return
+
+    keep_slowest = app.config['SQL_INSTRUMENTATION_SLOWEST']
+    threshold = app.config['SQL_N_PLUS_ONE_THRESHOLD']
+
+    with app.app_context():
+        engine = db.engine
+
+    @event.listens_for(engine, 'before_cursor_execute')
+    def start_timer(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault('query_start_time', []).append(time.perf_counter())
+
+    @event.listens_for(engine, 'after_cursor_execute')
+    def record_statement(conn, cursor, statement, parameters, context,
+                         executemany):
+        duration = time.perf_counter() - conn.info['query_start_time'].pop()
+        if not has_request_context():
+            return
+        stats = g.get('sql_stats')
+        if stats is None:
+            stats = g.sql_stats = RequestSQLStats(keep_slowest)
+        stats.add(statement, duration)
+
+    @app.after_request
+    def report_sql_stats(response):
+        stats = g.pop('sql_stats', None)
+        if stats is None:
+            return response
+
+        db_ms = stats.total * 1000
+        response.headers.add(
+            'Server-Timing',
+            f'db;dur={db_ms:.2f};desc="{stats.count} queries"'
+        )
+
+        repeated = [
+            {'statement': statement, 'count': count}
+            for statement, count in stats.statements.most_common()
+            if count >= threshold
+        ]
+        record = {
+            'method': request.method,
+            'path': request.path,
+            'endpoint': request.endpoint,
+            'status': response.status_code,
+            'queries': stats.count,
+            'db_ms': round(db_ms, 2),
+            'slowest': [
+                {'ms': round(duration * 1000, 2), 'statement': statement}
+                for duration, _, statement in sorted(stats.slowest,
+                                                     reverse=True)
+            ],
+        }
+        if repeated:
+            record['n_plus_one'] = repeated
+            logger.warning(json.dumps(record))
+        else:
+            logger.info(json.dumps(record))
+        return response
@@ -0,0 +1,186 @@
+#!/usr/bin/python3
+"""
+In-process background jobs for long imports and exports.
+
+Jobs run on a bounded thread pool inside an app context, so a large
+/import or /export does not tie up a web worker. Each job belongs to the
+user that started it; finished jobs and their result files are dropped
+once they are older than JOBS_RESULT_TTL seconds, checked every
+JOBS_GC_INTERVAL seconds by a thread each serving process starts on its
+first request.
+
+Jobs are only known to the process that started them: /jobs/<id> answers
+404 from any other one. Deployments using async jobs must send a user's
+requests to a single process, e.g. one gunicorn worker with threads
+(`gunicorn -w 1 --threads 8`) or sticky sessions.
+"""
+import os
+import tempfile
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+
+class JobQueueFull(RuntimeError):
+    """Raised when too many jobs are already queued or running."""
+
+
+class Job:
+    """A background job and its progress, as reported by /jobs/<id>."""
+
+    def __init__(self, user_id, kind):
+        self.id = uuid.uuid4().hex
+        self.user_id = user_id
+        self.kind = kind
+        self.status = 'queued'
+        self.progress = {}
+        self.error = None
+        # Either a JSON-able result or a file for /jobs/<id>/result
+        self.result = None
+        self.result_path = None
+        self.result_mimetype = None
+        self.result_filename = None
+        self.created_at = time.time()
+        self.finished_at = None
+
+    @property
+    def finished(self):
+        return self.status in ('done', 'failed')
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'kind': self.kind,
+            'status': self.status,
+            'progress': dict(self.progress),
+            'error': self.error,
+            'created_at': self.created_at,
+            'finished_at': self.finished_at,
+        }
+
+
+class JobManager:
+    """Runs jobs on a thread pool and keeps track of them until they expire."""
+
+    def __init__(self, app=None):
+        self._jobs = {}
+        self._lock = threading.Lock()
+        self._executor = None
+        self._gc_thread = None
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.app = app
+        self.max_pending = app.config['JOBS_MAX_PENDING']
+        self.ttl = app.config['JOBS_RESULT_TTL']
+        self.directory = app.config['JOBS_DIR']
+        os.makedirs(self.directory, exist_ok=True)
+        self._executor = ThreadPoolExecutor(
+            max_workers=app.config['JOBS_MAX_WORKERS'],
+            thread_name_prefix='passkeyper-job'
+        )
+        app.extensions['jobs'] = self
+
+        interval = app.config['JOBS_GC_INTERVAL']
+        if interval > 0:
+            app.before_request(lambda: self._start_gc(interval))
+
+    def _start_gc(self, interval):
+        """Starts the garbage collection thread, once, on the first request."""
+        if self._gc_thread is not None:
+            return
+        with self._lock:
+            if self._gc_thread is None:
+                self._gc_thread = threading.Thread(
+                    target=self._collect_forever, args=(interval,),
+                    name='passkeyper-job-gc', daemon=True
+                )
+                self._gc_thread.start()
+
+    def _collect_forever(self, interval):
+        while True:
+            time.sleep(interval)
+            try:
+                self.collect_garbage()
+            except Exception as e:
+                self.app.logger.warning("Job garbage collection failed: %s", e)
+
+    def new_file(self, suffix=''):
+        """Creates an empty file for a job's input or output, returns its path."""
+        fd, path = tempfile.mkstemp(suffix=suffix, dir=self.directory)
+        os.close(fd)
+        return path
+
+    def submit(self, user_id, kind, func, *args):
+        """
+        Queues func(job, *args) to run in an app context, and returns the
+        job. Raises JobQueueFull when JOBS_MAX_PENDING jobs are unfinished.
+        """
+        self.collect_garbage()
+        job = Job(user_id, kind)
+        with self._lock:
+            pending = sum(1 for j in self._jobs.values() if not j.finished)
+            if pending >= self.max_pending:
+                raise JobQueueFull("Too many jobs are running, try again later")
+            self._jobs[job.id] = job
+        self._executor.submit(self._run, job, func, args)
+        return job
+
+    def _run(self, job, func, args):
+        with self.app.app_context():
+            job.status = 'running'
+            try:
+                func(job, *args)
+                job.status = 'done'
+            except Exception as e:
+                job.error = str(e)
+                job.status = 'failed'
+            finally:
+                job.finished_at = time.time()
+
+    def get(self, job_id, user_id):
+        """Returns a job of the given user, or None."""
+        self.collect_garbage()
+        with self._lock:
+            job = self._jobs.get(job_id)
+        if job is None or job.user_id != user_id:
+            return None
+        return job
+
+    def collect_garbage(self):
+        """Forgets finished jobs older than the TTL and deletes their files."""
+        cutoff = time.time() - self.ttl
+        with self._lock:
+            expired = [job for job in self._jobs.values()
+                       if job.finished and job.finished_at < cutoff]
+            for job in expired:
+                del self._jobs[job.id]
+        for job in expired:
+            if job.result_path:
+                try:
+                    os.remove(job.result_path)
+                except OSError:
+                    pass
+
+
+jobs = JobManager()
+
+
+def spool_stream(stream, path, max_bytes, chunk_size=64 * 1024):
+    """
+    Copies a request stream into a file so a job can read it after the
+    request ends. Returns False, leaving the file partly written, when
+    the stream is longer than max_bytes.
+    """
+    total = 0
+    with open(path, 'wb') as output:
+        while True:
+            chunk = stream.read(chunk_size)
+            if not chunk:
+                return True
+            total += len(chunk)
+            if total > max_bytes:
+                return False
+            output.write(chunk)
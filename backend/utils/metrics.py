@@ -0,0 +1,275 @@
+#!/usr/bin/python3
+"""
+Prometheus-compatible metrics, served on /metrics.
+
+Every metric keeps one shard of values per thread, so recording a value
+never takes a lock: a thread only writes to its own shard. Shards are
+added up when /metrics is scraped, and the shards of threads that have
+exited are folded into a single retired shard at that point.
+"""
+import threading
+import time
+from bisect import bisect_left
+from backend.models import db
+from flask import g, request
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0,
+                   10.0)
+
+
+class Metric:
+    """
+    A metric family whose values are lists of floats per label set,
+    added up element by element across threads.
+    """
+    type = None
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._shards = {}
+        self._retired = {}
+
+    def _new_cell(self):
+        return [0.0]
+
+    def _cell(self, labels):
+        """The calling thread's values for a label set."""
+        try:
+            shard = self._local.shard
+        except AttributeError:
+            shard = self._local.shard = {}
+            with self._lock:
+                self._shards[threading.current_thread()] = shard
+        cell = shard.get(labels)
+        if cell is None:
+            cell = shard[labels] = self._new_cell()
+        return cell
+
+    def collect(self):
+        """Returns {labels: values} summed over all threads."""
+        totals = {}
+
+        def add(items):
+            for labels, cell in items:
+                total = totals.get(labels)
+                if total is None:
+                    totals[labels] = list(cell)
+                else:
+                    for i, value in enumerate(cell):
+                        total[i] += value
+
+        with self._lock:
+            for thread, shard in list(self._shards.items()):
+                items = list(shard.items())
+                if not thread.is_alive():
+                    del self._shards[thread]
+                    for labels, cell in items:
+                        retired = self._retired.get(labels)
+                        if retired is None:
+                            self._retired[labels] = list(cell)
+                        else:
+                            for i, value in enumerate(cell):
+                                retired[i] += value
+                else:
+                    add(items)
+            add(self._retired.items())
+        return totals
+
+    def samples(self):
+        """Yields (suffix, labels dict, value) for the exposition format."""
+        for labels, cell in sorted(self.collect().items()):
+            yield '', dict(zip(self.labelnames, labels)), cell[0]
+
+
+class Counter(Metric):
+    type = 'counter'
+
+    def inc(self, *labels, amount=1):
+        self._cell(labels)[0] += amount
+
+
+class Gauge(Metric):
+    """A gauge moved up and down by the threads that use it."""
+    type = 'gauge'
+
+    def inc(self, *labels, amount=1):
+        self._cell(labels)[0] += amount
+
+    def dec(self, *labels, amount=1):
+        self._cell(labels)[0] -= amount
+
+
+class CallbackGauge(Metric):
+    """
+    A gauge whose value is read from a function when /metrics is
+    scraped, inside that request's app context.
+    """
+    type = 'gauge'
+
+    def __init__(self, name, documentation, callback):
+        super().__init__(name, documentation)
+        self.callback = callback
+
+    def samples(self):
+        value = self.callback()
+        if value is not None:
+            yield '', {}, value
+
+
+class Histogram(Metric):
+    type = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(),
+                 buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(buckets)
+
+    def _new_cell(self):
+        # One count per bucket plus +Inf, then the sum and the count
+        return [0.0] * (len(self.buckets) + 3)
+
+    def observe(self, value, *labels):
+        cell = self._cell(labels)
+        cell[bisect_left(self.buckets, value)] += 1
+        cell[-2] += value
+        cell[-1] += 1
+
+    def samples(self):
+        for labels, cell in sorted(self.collect().items()):
+            labels = dict(zip(self.labelnames, labels))
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float('inf'),), cell):
+                cumulative += count
+                le = '+Inf' if bound == float('inf') else repr(bound)
+                yield '_bucket', {**labels, 'le': le}, cumulative
+            yield '_sum', labels, cell[-2]
+            yield '_count', labels, cell[-1]
+
+
+class Registry:
+    """The metrics rendered by /metrics."""
+
+    def __init__(self):
+        self.metrics = []
+
+    def register(self, metric):
+        self.metrics.append(metric)
+        return metric
+
+    def render(self):
+        """Renders every metric in the Prometheus text format."""
+        lines = []
+        for metric in self.metrics:
+            lines.append(f'# HELP {metric.name} {metric.documentation}')
+            lines.append(f'# TYPE {metric.name} {metric.type}')
+            for suffix, labels, value in metric.samples():
+                if labels:
+                    label_text = ','.join(
+                        f'{name}="{escape(value)}"'
+                        for name, value in labels.items()
+                    )
+                    lines.append(f'{metric.name}{suffix}{{{label_text}}} '
+                                 f'{format_value(value)}')
+                else:
+                    lines.append(f'{metric.name}{suffix} {format_value(value)}')
+        return '\n'.join(lines) + '\n'
+
+
+def format_value(value):
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+def escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+registry = Registry()
+
+REQUESTS = registry.register(Counter(
+    'passkeyper_http_requests_total', 'HTTP requests handled.',
+    ('endpoint', 'method', 'status')))
+REQUEST_SECONDS = registry.register(Histogram(
+    'passkeyper_http_request_duration_seconds',
+    'Time spent handling HTTP requests.', ('endpoint',)))
+IN_FLIGHT = registry.register(Gauge(
+    'passkeyper_http_requests_in_flight', 'HTTP requests being handled.'))
+BCRYPT_SECONDS = registry.register(Histogram(
+    'passkeyper_bcrypt_seconds',
+    'Time spent hashing or checking master passwords, queueing included.',
+    ('operation',), buckets=(0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)))
+
+TRASH_PURGED = registry.register(Counter(
+    'passkeyper_trash_purged_total',
+    'Trashed entries deleted by the retention purge.'))
+TRASH_PURGE_SECONDS = registry.register(Histogram(
+    'passkeyper_trash_purge_seconds', 'Time spent per retention purge run.',
+    buckets=(0.1, 0.5, 1.0, 5.0, 15.0, 60.0, 300.0)))
+TRASH_PURGE_FAILURES = registry.register(Counter(
+    'passkeyper_trash_purge_failures_total',
+    'Retention purge runs that ended in an error.'))
+
+
+def endpoint_label():
+    """The endpoint without the v1.main./v1.auth. prefix, e.g. login.login."""
+    if request.endpoint is None:
+        return 'unmatched'
+    return '.'.join(request.endpoint.split('.')[-2:])
+
+
+def pool_statistic(method, minimum=None):
+    """Reads a statistic of the connection pool, if the pool has it."""
+    def read():
+        func = getattr(db.engine.pool, method, None)
+        if func is None:
+            return None
+        value = func()
+        return value if minimum is None else max(value, minimum)
+    return read
+
+
+registry.register(CallbackGauge(
+    'passkeyper_db_pool_checked_out',
+    'Database connections checked out of the pool.',
+    pool_statistic('checkedout')))
+registry.register(CallbackGauge(
+    'passkeyper_db_pool_overflow',
+    'Database connections open beyond the pool size.',
+    # QueuePool counts up from -pool_size while under its size
+    pool_statistic('overflow', minimum=0)))
+registry.register(CallbackGauge(
+    'passkeyper_db_pool_size', 'Size of the database connection pool.',
+    pool_statistic('size')))
+
+
+def init_metrics(app):
+    """
+    Records request metrics. Must be called before other before_request
+    hooks are added, so requests they turn away are counted too.
+    """
+    @app.before_request
+    def start_request_timer():
+        g.metrics_start = time.perf_counter()
+        IN_FLIGHT.inc()
+
+    @app.after_request
+    def record_request(response):
+        start = g.get('metrics_start')
+        if start is not None:
+            endpoint = endpoint_label()
+            REQUESTS.inc(endpoint, request.method, str(response.status_code))
+            # Timed up to when the server closes the response, so streamed
+            # bodies (e.g. /export) count the time spent sending them
+            response.call_on_close(lambda: REQUEST_SECONDS.observe(
+                time.perf_counter() - start, endpoint))
+        return response
+
+    @app.teardown_request
+    def end_request(exc):
+        if g.pop('metrics_start', None) is not None:
+            IN_FLIGHT.dec()
@@ -0,0 +1,70 @@
+#!/usr/bin/python3
+"""Keyset (cursor) pagination helpers"""
+import base64
+import json
+from sqlalchemy import and_, or_
+
+
+class InvalidCursor(ValueError):
+    """Raised when a client sends a cursor that cannot be decoded."""
+
+
+def encode_cursor(values):
+    """Encodes the sort key values of the last row into an opaque cursor."""
+    raw = json.dumps(list(values), separators=(',', ':'))
+    return base64.urlsafe_b64encode(raw.encode('utf-8')).decode('ascii').rstrip('=')
+
+
+def decode_cursor(cursor, size, nullable=()):
+    """
+    Decodes a cursor made by encode_cursor into a list of `size` integer
+    values, the ones at the `nullable` positions possibly None.
+    """
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode('ascii')))
+    except (ValueError, TypeError):
+        raise InvalidCursor("Malformed cursor")
+    if not isinstance(values, list) or len(values) != size:
+        raise InvalidCursor("Malformed cursor")
+    # Only what encode_cursor writes gets anywhere near SQL
+    for i, value in enumerate(values):
+        if value is None and i in nullable:
+            continue
+        if type(value) is not int:
+            raise InvalidCursor("Malformed cursor")
+    return values
+
+
+def keyset_filter(columns, values):
+    """
+    Builds the WHERE clause that selects rows strictly after `values`
+    in ascending (columns...) order, e.g. for (a, b):
+    a > :a OR (a = :a AND b > :b)
+    """
+    clauses = []
+    for i, column in enumerate(columns):
+        equal = [columns[j] == values[j] for j in range(i)]
+        clauses.append(and_(*equal, column > values[i]))
+    return or_(*clauses)
+
+
+def keyset_page(query, columns, after=None, limit=10):
+    """
+    Fetches one page of `query` ordered by `columns`, starting after the
+    cursor `after`. One extra row is read to know if there is a next page,
+    so no COUNT query is needed.
+    Returns (rows, next_cursor), next_cursor being None on the last page.
+    """
+    if after:
+        values = decode_cursor(after, len(columns))
+        query = query.filter(keyset_filter(columns, values))
+
+    rows = query.order_by(*columns).limit(limit + 1).all()
+
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        last = rows[-1]
+        next_cursor = encode_cursor([getattr(last, column.key) for column in columns])
+    return rows, next_cursor
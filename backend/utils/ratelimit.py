@@ -0,0 +1,129 @@
+#!/usr/bin/python3
+"""
+Rate limiting for the authentication routes.
+
+Limits are token buckets keyed by client IP and by email address, checked
+before a route touches the database or bcrypt, so a burst of credential
+stuffing is turned away cheaply with a 429 and a Retry-After header.
+
+Buckets live in a bounded in-process store by default. Setting
+RATELIMIT_BACKEND to the import path of another RateLimitBackend class
+(for example one backed by a store shared between nodes) replaces it.
+"""
+import math
+import threading
+import time
+from collections import OrderedDict
+from functools import wraps
+from flask import current_app, jsonify, request
+from werkzeug.utils import import_string
+
+
+class RateLimitBackend:
+    """Interface of the stores that keep the token buckets."""
+
+    def __init__(self, app):
+        self.app = app
+
+    def hit(self, key, limit, period):
+        """
+        Takes one token from the bucket `key`, which holds up to `limit`
+        tokens and refills `limit` tokens every `period` seconds.
+        Returns 0 when a token was taken, otherwise the number of seconds
+        until one is available.
+        """
+        raise NotImplementedError()
+
+
+class MemoryBackend(RateLimitBackend):
+    """
+    Token buckets in this process, one (tokens, updated_at) tuple per key.
+    Past RATELIMIT_MAX_KEYS keys the least recently used buckets are
+    dropped, so memory stays bounded however many clients are seen.
+    """
+
+    def __init__(self, app):
+        super().__init__(app)
+        self.max_keys = app.config['RATELIMIT_MAX_KEYS']
+        self._buckets = OrderedDict()
+        self._lock = threading.Lock()
+
+    def hit(self, key, limit, period):
+        rate = limit / period
+        now = time.monotonic()
+        with self._lock:
+            tokens, updated_at = self._buckets.pop(key, (limit, now))
+            tokens = min(limit, tokens + (now - updated_at) * rate)
+            if tokens >= 1:
+                tokens -= 1
+                wait = 0
+            else:
+                wait = (1 - tokens) / rate
+            self._buckets[key] = (tokens, now)
+            if len(self._buckets) > self.max_keys:
+                self._buckets.popitem(last=False)
+        return wait
+
+
+def parse_rate(rate):
+    """Parses a rate like '10/60' (10 attempts per 60 seconds)."""
+    if not rate:
+        return None
+    limit, period = rate.split('/')
+    return int(limit), float(period)
+
+
+class RateLimiter:
+    """Applies the RATELIMIT_<NAME>_PER_IP/_PER_EMAIL limits to routes."""
+
+    def __init__(self, app=None):
+        self.backend = None
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        backend_class = app.config.get('RATELIMIT_BACKEND') or MemoryBackend
+        if isinstance(backend_class, str):
+            backend_class = import_string(backend_class)
+        self.backend = backend_class(app)
+        app.extensions['rate_limiter'] = self
+
+    def retry_after(self, name):
+        """Seconds the current request has to wait, 0 when it may go on."""
+        config = current_app.config
+        if not config['RATELIMIT_ENABLED']:
+            return 0
+
+        keys = []
+        per_ip = parse_rate(config.get(f'RATELIMIT_{name.upper()}_PER_IP'))
+        if per_ip:
+            keys.append((f'{name}:ip:{request.remote_addr}', per_ip))
+        per_email = parse_rate(config.get(f'RATELIMIT_{name.upper()}_PER_EMAIL'))
+        if per_email:
+            data = request.get_json(silent=True)
+            email = data.get('email') if isinstance(data, dict) else None
+            if isinstance(email, str) and email.strip():
+                keys.append((f'{name}:email:{email.strip().lower()}', per_email))
+
+        for key, (limit, period) in keys:
+            wait = self.backend.hit(key, limit, period)
+            if wait:
+                return wait
+        return 0
+
+    def limit(self, name):
+        """Decorator rejecting requests over the limits named `name`."""
+        def decorator(view):
+            @wraps(view)
+            def wrapper(*args, **kwargs):
+                wait = self.retry_after(name)
+                if wait:
+                    return jsonify({
+                        "error": "Too many attempts, please try again later"
+                    }), 429, {"Retry-After": str(math.ceil(wait))}
+                return view(*args, **kwargs)
+            return wrapper
+        return decorator
+
+
+limiter = RateLimiter()
@@ -0,0 +1,202 @@
+#!/usr/bin/python3
+"""
+Trash retention: entries left in the trash longer than TRASH_RETENTION_DAYS
+are deleted for good.
+
+A purge walks the (in_trash, moved_at) index in batches of
+TRASH_PURGE_BATCH_SIZE entries. Each batch is its own short transaction
+that deletes the entries like emptying the trash does (a change sequence
+bump and tombstones per user, so sync clients and snapshots see the
+deletions) and is followed by a TRASH_PURGE_PAUSE second pause, so a
+large backlog never holds locks for long or crowds out requests.
+
+Retention is off unless TRASH_RETENTION_DAYS is set. Purges then run on
+demand with `flask trash-purge`, and every TRASH_PURGE_INTERVAL seconds
+in a background thread of each serving process, started by its first
+request so CLI commands (e.g. `flask db upgrade`) never start one. Runs
+are reported on /metrics only.
+"""
+import threading
+import time
+from collections import defaultdict
+from datetime import timedelta
+import click
+from backend.models import db
+from backend.models.password import PasswordEntry
+from backend.utils.metrics import (CallbackGauge, TRASH_PURGED,
+                                   TRASH_PURGE_FAILURES, TRASH_PURGE_SECONDS,
+                                   registry)
+from backend.utils.sessions import utcnow
+from backend.utils.vault import (adjust_counters, entry_size_column,
+                                 next_change_seq, record_deletions)
+from flask import current_app
+from flask.cli import with_appcontext
+from sqlalchemy import delete, func, select, true
+
+
+def expired_filter(cutoff):
+    """Entries moved to the trash before cutoff."""
+    return (PasswordEntry.in_trash == true(),
+            PasswordEntry.moved_at < cutoff)
+
+
+def purge_batch(cutoff, batch_size):
+    """
+    Deletes up to batch_size trashed entries moved before cutoff, oldest
+    first, and commits. Returns (entries deleted, entries selected).
+    """
+    candidates = db.session.execute(
+        select(PasswordEntry.id, PasswordEntry.user_id)
+        .where(*expired_filter(cutoff))
+        .order_by(PasswordEntry.moved_at)
+        .limit(batch_size)
+    ).all()
+
+    by_user = defaultdict(list)
+    for entry_id, user_id in candidates:
+        by_user[user_id].append(entry_id)
+
+    deleted = 0
+    try:
+        # Users in a fixed order, so concurrent purges lock them alike
+        for user_id in sorted(by_user):
+            change_seq = next_change_seq(user_id)
+            # Entries restored since they were selected are left alone
+            rows = db.session.execute(
+                delete(PasswordEntry).where(
+                    PasswordEntry.user_id == user_id,
+                    PasswordEntry.id.in_(by_user[user_id]),
+                    *expired_filter(cutoff)
+                ).returning(PasswordEntry.id, entry_size_column())
+            ).all()
+            record_deletions(user_id, [entry_id for entry_id, _ in rows],
+                             change_seq)
+            adjust_counters(user_id, trash=-len(rows),
+                            entry_bytes=-sum(size for _, size in rows))
+            deleted += len(rows)
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+    return deleted, len(candidates)
+
+
+class TrashPurger:
+    """Runs trash retention purges, in the background when configured."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.last_success_at = None
+        self.thread = None
+        self._start_lock = threading.Lock()
+
+    def init_app(self, app):
+        self.app = app
+        app.extensions['trash_purger'] = self
+        app.cli.add_command(purge_command)
+
+        interval = app.config['TRASH_PURGE_INTERVAL']
+        if interval > 0 and app.config['TRASH_RETENTION_DAYS'] > 0:
+            app.before_request(lambda: self._start(interval))
+
+    def _start(self, interval):
+        """Starts the purge thread, once, when the app serves a request."""
+        if self.thread is not None:
+            return
+        with self._start_lock:
+            if self.thread is None:
+                self.thread = threading.Thread(
+                    target=self._purge_forever, args=(interval,),
+                    name='passkeyper-trash-purger', daemon=True
+                )
+                self.thread.start()
+
+    def purge(self, retention_days=None, batch_size=None, pause=None):
+        """
+        Deletes every entry in the trash for longer than retention_days,
+        batch by batch. Needs an app context. Returns the number deleted.
+        """
+        config = current_app.config
+        if retention_days is None:
+            retention_days = config['TRASH_RETENTION_DAYS']
+        if batch_size is None:
+            batch_size = config['TRASH_PURGE_BATCH_SIZE']
+        if pause is None:
+            pause = config['TRASH_PURGE_PAUSE']
+        cutoff = utcnow() - timedelta(days=retention_days)
+
+        # One purge at a time per process
+        with self.lock:
+            start = time.perf_counter()
+            purged = 0
+            try:
+                while True:
+                    deleted, selected = purge_batch(cutoff, batch_size)
+                    purged += deleted
+                    TRASH_PURGED.inc(amount=deleted)
+                    if selected < batch_size:
+                        break
+                    time.sleep(pause)
+            except Exception:
+                TRASH_PURGE_FAILURES.inc()
+                raise
+            finally:
+                TRASH_PURGE_SECONDS.observe(time.perf_counter() - start)
+            self.last_success_at = utcnow()
+        return purged
+
+    def _purge_forever(self, interval):
+        while True:
+            time.sleep(interval)
+            try:
+                with self.app.app_context():
+                    self.purge()
+            except Exception as e:
+                self.app.logger.warning("Trash purge failed: %s", e)
+
+
+purger = TrashPurger()
+
+
+def last_success_timestamp():
+    last = purger.last_success_at
+    return last.timestamp() if last is not None else None
+
+
+registry.register(CallbackGauge(
+    'passkeyper_trash_purge_last_success_timestamp_seconds',
+    'When the last retention purge of this process finished.',
+    last_success_timestamp))
+
+
+@click.command('trash-purge')
+@click.option('--older-than-days', type=int, default=None,
+              help='Retention in days [default: TRASH_RETENTION_DAYS].')
+@click.option('--batch-size', type=int, default=None,
+              help='Entries per transaction [default: TRASH_PURGE_BATCH_SIZE].')
+@click.option('--dry-run', is_flag=True,
+              help='Only count the entries that would be deleted.')
+@with_appcontext
+def purge_command(older_than_days, batch_size, dry_run):
+    """Deletes the entries left in the trash past the retention period."""
+    if older_than_days is None:
+        older_than_days = current_app.config['TRASH_RETENTION_DAYS']
+    if older_than_days <= 0:
+        raise click.UsageError("Set TRASH_RETENTION_DAYS or pass a positive "
+                               "--older-than-days.")
+
+    if dry_run:
+        cutoff = utcnow() - timedelta(days=older_than_days)
+        count = db.session.execute(
+            select(func.count()).select_from(PasswordEntry)
+            .where(*expired_filter(cutoff))
+        ).scalar()
+        click.echo(f"{count} entries in the trash for over "
+                   f"{older_than_days} days")
+        return
+
+    start = time.perf_counter()
+    purged = purger.purge(older_than_days, batch_size)
+    click.echo(f"Purged {purged} entries in the trash for over "
+               f"{older_than_days} days "
+               f"({time.perf_counter() - start:.2f} s)")
@@ -0,0 +1,92 @@
+#!/usr/bin/python3
+"""
+Blind index search over client-encrypted entries.
+
+Clients may send `search_tokens` with an entry: opaque strings, typically
+HMACs under a key only the client holds of normalized name trigrams or of
+the url's host. They are stored in entry_search_tokens and searched by
+exact match, so the server never sees what they were computed from.
+Entries sent without tokens are simply not found by searches.
+
+Password fingerprints (see /passwords/health) are keyed hashes of the
+same kind and follow the same format.
+"""
+import re
+from backend.models import db
+from backend.models.entry_search_token import EntrySearchToken
+from flask import current_app
+from sqlalchemy import delete, distinct, func, insert, select
+
+# base64 (standard or url-safe) or hex, as long as the token column.
+# Used with fullmatch: a $ would also let a trailing newline through
+TOKEN_PATTERN = re.compile(r'[A-Za-z0-9+/_=-]{1,64}')
+
+MATCH_MODES = ('all', 'any')
+
+
+class InvalidSearchTokens(ValueError):
+    """Raised when a client sends search tokens that cannot be stored."""
+
+
+def valid_token(value):
+    """Whether value can be stored as a search token or a fingerprint."""
+    return isinstance(value, str) and TOKEN_PATTERN.fullmatch(value) is not None
+
+
+def parse_search_tokens(value, max_tokens=None):
+    """
+    Validates a list of search tokens sent by a client and returns it
+    without duplicates, in sorted order.
+    """
+    if max_tokens is None:
+        max_tokens = current_app.config['SEARCH_MAX_ENTRY_TOKENS']
+    if not isinstance(value, list):
+        raise InvalidSearchTokens("search_tokens must be a list")
+    for token in value:
+        if not valid_token(token):
+            raise InvalidSearchTokens("Invalid search token")
+    tokens = set(value)
+    if len(tokens) > max_tokens:
+        raise InvalidSearchTokens(f"At most {max_tokens} search tokens")
+    return sorted(tokens)
+
+
+def add_search_tokens(user_id, tokens_by_entry):
+    """Stores the tokens of new entries, given as {entry_id: tokens}."""
+    rows = [
+        {'user_id': user_id, 'entry_id': entry_id, 'token': token}
+        for entry_id, tokens in tokens_by_entry.items()
+        for token in tokens
+    ]
+    if rows:
+        db.session.execute(insert(EntrySearchToken), rows)
+
+
+def delete_search_tokens(user_id, entry_ids):
+    """Removes every token of the given entries."""
+    if entry_ids:
+        db.session.execute(delete(EntrySearchToken).where(
+            EntrySearchToken.user_id == user_id,
+            EntrySearchToken.entry_id.in_(entry_ids)
+        ))
+
+
+def set_search_tokens(user_id, entry_id, tokens):
+    """Replaces the tokens of an entry."""
+    delete_search_tokens(user_id, [entry_id])
+    add_search_tokens(user_id, {entry_id: tokens})
+
+
+def matching_entry_ids(user_id, tokens, match='all'):
+    """
+    A select of the ids of a user's entries that have all (or any) of
+    the tokens, answered from the (user_id, token, entry_id) index.
+    """
+    stmt = select(EntrySearchToken.entry_id).where(
+        EntrySearchToken.user_id == user_id,
+        EntrySearchToken.token.in_(tokens)
+    )
+    if match == 'any':
+        return stmt.distinct()
+    return stmt.group_by(EntrySearchToken.entry_id).having(
+        func.count(distinct(EntrySearchToken.token)) == len(set(tokens)))
@@ -0,0 +1,84 @@
+#!/usr/bin/python3
+"""
+Serialization of password entries.
+
+Listings select the entry columns as plain row tuples instead of loading
+PasswordEntry objects, which skips the identity map and attribute
+instrumentation for every row, and encode them with msgspec. Every route
+returns the same field set, ENTRY_FIELDS, with timestamps as ISO 8601 UTC.
+"""
+from datetime import timezone
+import msgspec
+from backend.models import db
+from backend.models.password import PasswordEntry
+from flask import current_app
+
+# The fields of a password entry sent to clients, in order
+ENTRY_FIELDS = ('id', 'name', 'username', 'password', 'url', 'favicon_url',
+                'notes', 'created_at', 'updated_at', 'in_trash', 'moved_at')
+
+TIMESTAMP_FIELDS = frozenset(('created_at', 'updated_at', 'moved_at'))
+
+encoder = msgspec.json.Encoder()
+
+
+class InvalidFields(ValueError):
+    """Raised when a client asks for fields an entry does not have."""
+
+
+def parse_fields(value):
+    """
+    Parses a ?fields=a,b,c sparse fieldset into a tuple of ENTRY_FIELDS,
+    in canonical order and always including id. No value means all fields.
+    """
+    if not value:
+        return ENTRY_FIELDS
+    requested = {field.strip() for field in value.split(',') if field.strip()}
+    unknown = requested.difference(ENTRY_FIELDS)
+    if unknown:
+        raise InvalidFields("Unknown fields: " + ', '.join(sorted(unknown)))
+    requested.add('id')
+    return tuple(field for field in ENTRY_FIELDS if field in requested)
+
+
+def entry_columns(fields=ENTRY_FIELDS):
+    """The PasswordEntry columns of `fields`."""
+    return [getattr(PasswordEntry, field) for field in fields]
+
+
+def entry_query(user_id, fields=ENTRY_FIELDS):
+    """A query of a user's entries that yields row tuples of `fields`."""
+    return db.session.query(*entry_columns(fields)).filter(
+        PasswordEntry.user_id == user_id)
+
+
+def entry_dicts(rows, fields=ENTRY_FIELDS):
+    """
+    Turns row tuples into dicts keyed by `fields`. Rows may carry extra
+    trailing columns (e.g. sort keys), which are left out.
+    """
+    stamps = [i for i, field in enumerate(fields) if field in TIMESTAMP_FIELDS]
+    if not stamps:
+        return [dict(zip(fields, row)) for row in rows]
+
+    entries = []
+    for row in rows:
+        values = list(row)
+        # Naive timestamps are UTC, say so, or clients read them as local time
+        for i in stamps:
+            value = values[i]
+            if value is not None and value.tzinfo is None:
+                values[i] = value.replace(tzinfo=timezone.utc)
+        entries.append(dict(zip(fields, values)))
+    return entries
+
+
+def dumps(obj):
+    """Encodes obj as a JSON str."""
+    return encoder.encode(obj).decode('utf-8')
+
+
+def json_response(payload, status=200):
+    """Like jsonify(payload), status but encoded with msgspec."""
+    return current_app.response_class(encoder.encode(payload), status=status,
+                                      mimetype='application/json')
@@ -0,0 +1,217 @@
+#!/usr/bin/python3
+"""
+Server-side sessions stored in the user_sessions table.
+
+Every node reads and writes the same table, so a session works whichever
+worker serves the request. Recently used sessions are also kept in a small
+in-process LRU cache for SESSION_CACHE_TTL seconds, so most requests check
+the session without a query; a change made on another node is seen once
+the cached copy expires.
+
+Session rows are read and written on their own connection, never through
+db.session, so saving a session cannot commit a route's pending changes.
+"""
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timezone
+from backend.models import db
+from backend.models.user_session import UserSession
+from flask_session.base import ServerSideSessionInterface
+from sqlalchemy import delete, insert, select, update
+from sqlalchemy.exc import IntegrityError
+
+
+class TTLCache:
+    """A thread-safe LRU cache whose entries expire after `ttl` seconds."""
+
+    def __init__(self, max_size, ttl):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._items = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            item = self._items.get(key)
+            if item is None:
+                return None
+            if item[0] < time.monotonic():
+                del self._items[key]
+                return None
+            self._items.move_to_end(key)
+            return item[1]
+
+    def set(self, key, value):
+        if self.max_size <= 0:
+            return
+        with self._lock:
+            self._items[key] = (time.monotonic() + self.ttl, value)
+            self._items.move_to_end(key)
+            while len(self._items) > self.max_size:
+                self._items.popitem(last=False)
+
+    def pop(self, key):
+        with self._lock:
+            self._items.pop(key, None)
+
+
+def utcnow():
+    return datetime.now(timezone.utc)
+
+
+def as_utc(value):
+    """Some backends (SQLite) return naive datetimes for timezone columns."""
+    if value is not None and value.tzinfo is None:
+        return value.replace(tzinfo=timezone.utc)
+    return value
+
+
+class UserSessionInterface(ServerSideSessionInterface):
+    """Flask-Session interface backed by the UserSession model."""
+
+    # Expired rows are removed by the sweeper, not by the database
+    ttl = False
+
+    def __init__(self, app, cache_size, cache_ttl, refresh_interval,
+                 sweep_interval, sweep_batch_size, **kwargs):
+        self.table = UserSession.__table__
+        self.cache = TTLCache(cache_size, cache_ttl)
+        self.refresh_interval = refresh_interval
+        self.sweep_batch_size = sweep_batch_size
+        self._sweeper = None
+        self._sweeper_lock = threading.Lock()
+        super().__init__(app, **kwargs)
+
+        # Started by the first request, so CLI commands and processes that
+        # only build the app (e.g. the bcrypt pool's) never start one
+        if sweep_interval > 0:
+            app.before_request(lambda: self._start_sweeper(sweep_interval))
+
+    def _start_sweeper(self, interval):
+        """Starts the sweeper thread, once."""
+        if self._sweeper is not None:
+            return
+        with self._sweeper_lock:
+            if self._sweeper is None:
+                self._sweeper = threading.Thread(
+                    target=self._sweep_forever, args=(interval,),
+                    name='passkeyper-session-sweeper', daemon=True
+                )
+                self._sweeper.start()
+
+    def should_set_storage(self, app, session):
+        """
+        Writes modified sessions, but refreshes the expiry of unchanged ones
+        at most once per refresh_interval instead of on every request.
+        """
+        if session.modified:
+            return True
+        if not app.config['SESSION_REFRESH_EACH_REQUEST']:
+            return False
+        cached = self.cache.get(self._get_store_id(session.sid))
+        if cached is None:
+            return True
+        written_at = cached[1] - app.permanent_session_lifetime
+        return (utcnow() - written_at).total_seconds() >= self.refresh_interval
+
+    def _retrieve_session_data(self, store_id):
+        cached = self.cache.get(store_id)
+        if cached is not None:
+            data, expiry = cached
+            if expiry > utcnow():
+                return dict(data)
+            self.cache.pop(store_id)
+
+        with db.engine.connect() as connection:
+            row = connection.execute(
+                select(self.table.c.data, self.table.c.expiry)
+                .where(self.table.c.session_id == store_id)
+            ).first()
+        if row is None or row.data is None:
+            return None
+
+        expiry = as_utc(row.expiry)
+        if expiry is None or expiry <= utcnow():
+            self._delete_session(store_id)
+            return None
+
+        data = self.serializer.decode(row.data)
+        self.cache.set(store_id, (data, expiry))
+        return dict(data)
+
+    def _delete_session(self, store_id):
+        self.cache.pop(store_id)
+        with db.engine.begin() as connection:
+            connection.execute(
+                delete(self.table).where(self.table.c.session_id == store_id)
+            )
+
+    def _upsert_session(self, session_lifetime, session, store_id):
+        expiry = utcnow() + session_lifetime
+        values = {
+            'user_id': session.get('user_id'),
+            'data': self.serializer.encode(session),
+            'expiry': expiry,
+        }
+        updated = update(self.table).where(
+            self.table.c.session_id == store_id).values(**values)
+
+        with db.engine.begin() as connection:
+            stored = connection.execute(updated).rowcount
+        if not stored:
+            try:
+                with db.engine.begin() as connection:
+                    connection.execute(insert(self.table).values(
+                        session_id=store_id, **values))
+            except IntegrityError:
+                # Inserted by a concurrent request, or the user is gone
+                with db.engine.begin() as connection:
+                    stored = connection.execute(updated).rowcount
+                if not stored:
+                    self.cache.pop(store_id)
+                    return
+
+        self.cache.set(store_id, (dict(session), expiry))
+
+    def _delete_expired_sessions(self):
+        """Deletes expired sessions in batches of sweep_batch_size rows."""
+        deleted = 0
+        while True:
+            with db.engine.begin() as connection:
+                expired = select(self.table.c.id).where(
+                    self.table.c.expiry <= utcnow()
+                ).limit(self.sweep_batch_size)
+                count = connection.execute(
+                    delete(self.table).where(self.table.c.id.in_(expired))
+                ).rowcount
+            deleted += count
+            if count < self.sweep_batch_size:
+                return deleted
+
+    def _sweep_forever(self, interval):
+        while True:
+            time.sleep(interval)
+            try:
+                with self.app.app_context():
+                    self._delete_expired_sessions()
+            except Exception as e:
+                self.app.logger.warning("Session sweep failed: %s", e)
+
+
+def init_session_store(app):
+    """Makes the app keep its sessions in the user_sessions table."""
+    config = app.config
+    app.session_interface = UserSessionInterface(
+        app,
+        cache_size=config['SESSION_CACHE_SIZE'],
+        cache_ttl=config['SESSION_CACHE_TTL'],
+        refresh_interval=config['SESSION_REFRESH_INTERVAL'],
+        sweep_interval=config['SESSION_SWEEP_INTERVAL'],
+        sweep_batch_size=config['SESSION_SWEEP_BATCH_SIZE'],
+        key_prefix=config.get('SESSION_KEY_PREFIX', 'session:'),
+        permanent=config.get('SESSION_PERMANENT', True),
+        sid_length=config.get('SESSION_ID_LENGTH', 32),
+        serialization_format=config.get('SESSION_SERIALIZATION_FORMAT',
+                                        'msgpack'),
+    )
@@ -0,0 +1,93 @@
+#!/usr/bin/python3
+"""
+Materialized vault snapshots (VAULT_SNAPSHOTS = True).
+
+A snapshot is the JSON array of all a user's entries, trashed ones
+included, stored as one blob along with the vault generation it reflects.
+Entries are encrypted by the client, so the blob holds ciphertext only.
+
+When the vault has moved on since the snapshot was taken, the snapshot is
+brought up to date from the entries and tombstones written after its
+change_seq (the same feed as /passwords/changes) rather than rebuilt from
+every row. Until then, serving it is one primary key read.
+"""
+import msgspec
+from backend.models import db
+from backend.models.password import PasswordEntry
+from backend.models.password_tombstone import PasswordTombstone
+from backend.models.user import User
+from backend.models.vault_snapshot import VaultSnapshot
+from backend.utils.serializers import encoder, entry_dicts, entry_query
+from backend.utils.sessions import utcnow
+from sqlalchemy.exc import IntegrityError
+
+decoder = msgspec.json.Decoder()
+
+
+def full_snapshot(user_id):
+    """The JSON array of every entry of a user, in id order."""
+    rows = entry_query(user_id).order_by(PasswordEntry.id).all()
+    return encoder.encode(entry_dicts(rows))
+
+
+def updated_snapshot(user_id, snapshot, current_seq):
+    """
+    Applies the writes made after snapshot.change_seq, up to current_seq,
+    to the snapshot's data and returns the new data.
+    """
+    changed = entry_dicts(entry_query(user_id).filter(
+        PasswordEntry.change_seq > snapshot.change_seq,
+        PasswordEntry.change_seq <= current_seq
+    ).all())
+    deleted = {
+        entry_id for entry_id, in db.session.query(
+            PasswordTombstone.entry_id
+        ).filter(
+            PasswordTombstone.user_id == user_id,
+            PasswordTombstone.change_seq > snapshot.change_seq,
+            PasswordTombstone.change_seq <= current_seq
+        )
+    }
+    # Account changes bump the generation without touching entries
+    if not changed and not deleted:
+        return snapshot.data
+
+    entries = {entry['id']: entry for entry in decoder.decode(snapshot.data)}
+    for entry in changed:
+        entries[entry['id']] = entry
+    for entry_id in deleted:
+        entries.pop(entry_id, None)
+    return encoder.encode([entries[entry_id] for entry_id in sorted(entries)])
+
+
+def get_snapshot(user_id):
+    """
+    Returns (change_seq, data) of the user's up to date snapshot, taking
+    or refreshing it first when needed. None when the user is gone.
+    """
+    # Writes committed after this read are left for the next refresh
+    current_seq = db.session.query(User.change_seq).filter_by(
+        id=user_id).scalar()
+    if current_seq is None:
+        return None
+
+    snapshot = db.session.get(VaultSnapshot, user_id)
+    if snapshot is not None and snapshot.change_seq == current_seq:
+        return snapshot.change_seq, snapshot.data
+
+    if snapshot is None:
+        snapshot = VaultSnapshot(user_id=user_id)
+        data = full_snapshot(user_id)
+        db.session.add(snapshot)
+    else:
+        data = updated_snapshot(user_id, snapshot, current_seq)
+
+    snapshot.change_seq = current_seq
+    snapshot.data = data
+    snapshot.updated_at = utcnow()
+    try:
+        db.session.commit()
+    except IntegrityError:
+        # Another request took the first snapshot; this one is as good
+        db.session.rollback()
+    return current_seq, data
@@ -0,0 +1,195 @@
+#!/usr/bin/python3
+"""
+Bookkeeping shared by every route that writes to a user's vault.
+
+Each write takes the next value of the user's change sequence and stamps
+it on the entries it touches (or on tombstones for deleted entries), so
+sync clients can ask for everything that changed after a given value.
+The sequence is bumped with an UPDATE on the user's row, which also locks
+it until commit: writes to the same vault are serialized and sequence
+values become visible in increasing order.
+
+The sequence doubles as the vault's generation number: read routes use it
+to build ETags and answer conditional requests without reading the vault.
+
+The same row keeps counters of the vault's active and trashed entries and
+of the bytes of entry data they hold, which writes adjust in their own
+transaction, so listings and /vault/stats never count rows.
+`flask vault-recount` rebuilds them from the entries.
+"""
+import hashlib
+from functools import wraps
+import click
+from backend.models import db
+from backend.models.password import PasswordEntry
+from backend.models.password_tombstone import PasswordTombstone
+from backend.models.user import User
+from backend.utils.search import delete_search_tokens
+from flask import make_response, request, session
+from flask.cli import with_appcontext
+from sqlalchemy import case, func, insert, select, true, update
+
+# The client-encrypted fields counted in a user's entry_bytes
+DATA_FIELDS = ('name', 'username', 'password', 'url', 'favicon_url', 'notes')
+
+
+def next_change_seq(user_id):
+    """Bumps and returns the change sequence of a user's vault."""
+    return db.session.execute(
+        update(User)
+        .where(User.id == user_id)
+        # Keeps updated_at, which only tracks changes to the account itself
+        .values(change_seq=User.change_seq + 1, updated_at=User.updated_at)
+        .returning(User.change_seq)
+    ).scalar_one()
+
+
+def record_deletions(user_id, entry_ids, change_seq):
+    """
+    Records tombstones for permanently deleted entries and drops their
+    search tokens (the database cascades this too, where it enforces
+    foreign keys).
+    """
+    if not entry_ids:
+        return
+    delete_search_tokens(user_id, entry_ids)
+    db.session.execute(insert(PasswordTombstone), [
+        {'user_id': user_id, 'entry_id': entry_id, 'change_seq': change_seq}
+        for entry_id in entry_ids
+    ])
+
+
+def entry_size(entry):
+    """
+    The bytes of data of an entry, given as a model instance or a row dict
+    (the fields are ciphertext, so characters and bytes are the same).
+    """
+    if isinstance(entry, dict):
+        values = [entry.get(field) for field in DATA_FIELDS]
+    else:
+        values = [getattr(entry, field) for field in DATA_FIELDS]
+    return sum(len(value) for value in values if value)
+
+
+def entry_size_column():
+    """entry_size as an SQL expression, e.g. for DELETE ... RETURNING."""
+    return sum(func.coalesce(func.length(getattr(PasswordEntry, field)), 0)
+               for field in DATA_FIELDS)
+
+
+def adjust_counters(user_id, active=0, trash=0, entry_bytes=0):
+    """
+    Adds to the entry counters of a user, after next_change_seq has locked
+    the row, without committing.
+    """
+    if not (active or trash or entry_bytes):
+        return
+    db.session.execute(
+        update(User)
+        .where(User.id == user_id)
+        .values(active_count=User.active_count + active,
+                trash_count=User.trash_count + trash,
+                entry_bytes=User.entry_bytes + entry_bytes,
+                updated_at=User.updated_at)
+    )
+
+
+def recount(user_id):
+    """
+    Rebuilds the entry counters of a user from their entries and commits.
+    Returns whether they had drifted, None when the user is gone.
+    """
+    # Locking the user's row first keeps writes out while counting
+    current = db.session.execute(
+        select(User.active_count, User.trash_count, User.entry_bytes)
+        .where(User.id == user_id).with_for_update()
+    ).one_or_none()
+    if current is None:
+        return None
+    counted = db.session.execute(
+        # in_trash is nullable, NULL counting as not trashed
+        select(func.count(case((PasswordEntry.in_trash.is_not(true()),
+                                PasswordEntry.id))),
+               func.count(case((PasswordEntry.in_trash.is_(true()),
+                                PasswordEntry.id))),
+               func.coalesce(func.sum(entry_size_column()), 0))
+        .where(PasswordEntry.user_id == user_id)
+    ).one()
+    if tuple(current) == tuple(counted):
+        db.session.rollback()
+        return False
+    # A new generation, so responses cached with the old counts go stale
+    next_change_seq(user_id)
+    db.session.execute(
+        update(User)
+        .where(User.id == user_id)
+        .values(active_count=counted[0], trash_count=counted[1],
+                entry_bytes=counted[2], updated_at=User.updated_at)
+    )
+    db.session.commit()
+    return True
+
+
+@click.command('vault-recount')
+@click.option('--user-id', type=int, default=None,
+              help='Only this user [default: every user].')
+@with_appcontext
+def recount_command(user_id):
+    """Rebuilds the users' entry counters from their entries."""
+    if user_id is None:
+        user_ids = db.session.execute(
+            select(User.id).order_by(User.id)).scalars().all()
+    else:
+        user_ids = [user_id]
+
+    fixed = 0
+    for current_id in user_ids:
+        drifted = recount(current_id)
+        if drifted is None and user_id is not None:
+            raise click.BadParameter(f"No user {current_id}",
+                                     param_hint='--user-id')
+        if drifted:
+            fixed += 1
+    click.echo(f"Recounted {len(user_ids)} users, {fixed} had drifted")
+
+
+def vault_etag(view):
+    """
+    Decorator for read routes whose response only depends on the user's
+    vault: tags 200 responses with a strong ETag derived from the vault
+    generation and answers matching If-None-Match requests with a
+    304 Not Modified, without calling the view.
+    """
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        user_id = session.get('user_id')
+        if not user_id:
+            return view(*args, **kwargs)
+
+        generation = db.session.query(User.change_seq).filter_by(
+            id=user_id).scalar()
+        if generation is None:
+            return view(*args, **kwargs)
+
+        # The same generation gives different bodies per route and query
+        key = '|'.join([
+            str(user_id), str(generation), request.path,
+            '&'.join(sorted(
+                f'{name}={value}'
+                for name, value in request.args.items(multi=True)
+            ))
+        ])
+        etag = hashlib.sha1(key.encode('utf-8')).hexdigest()
+
+        if request.if_none_match.contains_weak(etag):
+            response = make_response('', 304)
+        else:
+            response = make_response(view(*args, **kwargs))
+            if response.status_code != 200:
+                return response
+        response.set_etag(etag)
+        # Clients may keep the response but must revalidate it on each use
+        response.headers['Cache-Control'] = 'private, no-cache'
+        return response
+
+    return wrapper